@@ -3,16 +3,18 @@ from __future__ import division
 from __future__ import print_function
 
 # Imports
-import os
 import sys
 import numpy as np
 import tensorflow as tf
 import argparse
-import os.path as osp
-from PIL import Image
 from functools import partial
 
-from eval import compute_map
+from eval import EvalReport
+from data import make_input_fns, make_eval_dataset_fn
+from train_eval import InProcessEvalHook, ThroughputHook
+from precision import (LOSS_SCALE, compute_gradients, session_config,
+                       use_mixed_precision)
+from augment import random_crop_and_flip, standardize
 #import models
 from tensorflow.core.framework import summary_pb2
 tf.logging.set_verbosity(tf.logging.INFO)
@@ -47,18 +49,23 @@ no_of_pts = 20
 no_of_steps = no_of_iters / no_of_pts
 log_dir = "/home/ubuntu/code/03_pascal_model_scratch_with_norm"
 
-def cnn_model_fn(features, labels, mode, num_classes=20):
+def cnn_model_fn(features, labels, mode, num_classes=20,
+                 precision='fp32'):
     # Write this function
     # Referred :https://github.com/tensorflow/models/blob/master/tutorials/image/mnist/convolutional.py#L243
     # Data Augmentation: https://stackoverflow.com/questions/38920240/tensorflow-image-operations-for-batches
     # ***crop size is 227?
 
-    flipped_imgs = tf.map_fn(lambda img: tf.image.random_flip_left_right(img), features['x'])
-    distorted_image = tf.map_fn(lambda img: tf.random_crop(img, [224, 224, 3]), flipped_imgs)
+    distorted_image = random_crop_and_flip(features['x'], size=224)
     tf.summary.image("train_images", distorted_image, max_outputs=60)
-    norm_imgs = tf.map_fn(lambda frame: tf.image.per_image_standardization(frame), distorted_image)
+    norm_imgs = standardize(distorted_image)
     input_layer = tf.reshape(norm_imgs, [-1, 224, 224, 3])
 
+    if precision == 'mixed':
+        # float16 compute on float32 master weights
+        use_mixed_precision()
+        input_layer = tf.cast(input_layer, tf.float16)
+
     ####### BLOCK 1
     # Convolutional Layer #1
     conv1 = tf.layers.conv2d(
@@ -236,6 +243,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
     # Logits Layer
     #print dropout.shape
     logits = tf.layers.dense(inputs=dense2, units=num_classes)
+    logits = tf.cast(logits, tf.float32)
 
     probs = tf.sigmoid(logits, name="sigmoid_tensor")
     pred_float = tf.greater_equal(probs, 0.5)
@@ -278,11 +286,13 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
                                                0.9)
         #summary_var(log_dir=log_dir,
         #            name="learning_rate", val=str(learning_rate), step=tf.train.get_global_step())
-        train_op = optimizer.minimize(
-            loss=loss,
+        grads_and_vars = compute_gradients(
+            optimizer, loss,
+            loss_scale=LOSS_SCALE if precision == 'mixed' else 1.)
+        train_op = optimizer.apply_gradients(
+            grads_and_vars,
             global_step=tf.train.get_global_step())
         train_summary = []
-        grads_and_vars=optimizer.compute_gradients(loss)
         for g, v in grads_and_vars:
             if g is not None:
                 #print(format(v.name))
@@ -308,71 +318,25 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         mode=mode, loss=loss, eval_metric_ops=eval_metric_ops)
 
 
-def load_pascal(data_dir, split='train'):
-    """
-    Function to read images from PASCAL data folder.
-    Args:
-        data_dir (str): Path to the VOC2007 directory.
-        split (str): train/val/trainval split to use.
-    Returns:
-        images (np.ndarray): Return a np.float32 array of
-            shape (N, H, W, 3), where H, W are 224px each,
-            and each image is in RGB format.
-        labels (np.ndarray): An array of shape (N, 20) of
-            type np.int32, with 0s and 1s; 1s for classes that
-            are active in that image.
-        weights: (np.ndarray): An array of shape (N, 20) of
-            type np.int32, with 0s and 1s; 1s for classes that
-            are confidently labeled and 0s for classes that
-            are ambiguous.
-    """
-    # Wrote this function
-    H = 256
-    W = 256
-
-    N_dict = {'train': 2501, 'val': 2510, 'trainval': 5011, 'test': 4952}
-    N = N_dict[split]
-
-    images = np.zeros((N, H, W, 3), dtype=np.float32)
-    labels = np.zeros((N, num_classes), dtype=np.int32)
-    weights = np.zeros((N, num_classes), dtype=np.int32)
-
-    #Load Images
-    file_name = data_dir + "ImageSets/Main/" + split + '.txt'
-    with open(file_name, 'r') as image_lst_file:
-        i=0
-        for line in image_lst_file.readlines():
-            img_no = line.strip('\n')
-            image_name = data_dir + 'JPEGImages/' + img_no + '.jpg'
-            img = Image.open(image_name)
-            img = img.resize((H, W), Image.ANTIALIAS)
-            imgarr = np.asarray(img, dtype=np.float32)
-            images[i, :, :, :] = imgarr
-            i += 1
-
-    for i in range(len(CLASS_NAMES)):
-        cls = CLASS_NAMES[i]
-        file_name = data_dir + "ImageSets/Main/" + cls + '_' + split + '.txt'
-        with open(file_name, 'r') as image_lst_file:
-            im_idx = 0
-            for line in image_lst_file.readlines():
-                _, is_present = line.strip('\n').split()
-                is_present = int(is_present)
-                if is_present == 1:
-                    labels[im_idx][i] = 1
-
-                if is_present != 0:
-                    weights[im_idx][i] = 1
-                im_idx += 1
-    return images, labels, weights
-
-
 def parse_args():
     parser = argparse.ArgumentParser(
         description='Train a classifier in tensorflow!')
     parser.add_argument(
         'data_dir', type=str, default='data/VOC2007',
         help='Path to PASCAL data storage')
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='Image decoding processes when building the store (0 = serial)')
+    parser.add_argument(
+        '--input', type=str, default='store',
+        choices=['store', 'jpeg', 'tfrecord'],
+        help='Input pipeline: uint8 memmap store or streaming tf.data')
+    parser.add_argument(
+        '--precision', type=str, default='fp32', choices=['fp32', 'mixed'],
+        help='mixed: float16 compute, float32 weights and loss scaling')
+    parser.add_argument(
+        '--jit', action='store_true',
+        help='Turn on XLA autoclustering')
     if len(sys.argv) == 1:
         parser.print_help()
         sys.exit(1)
@@ -407,33 +371,20 @@ def summary_var_lr(log_dir, name, val, step):
 def main():
     args = parse_args()
 
-    # Load training and eval data
-    # train_data, train_labels, train_weights = load_pascal(
-    #     args.data_dir, split='trainval')
-    # np.save(os.path.join(args.data_dir, 'trainval' + '_data_images'), train_data)
-    # np.save(os.path.join(args.data_dir, 'trainval' + '_data_labels'), train_labels)
-    # np.save(os.path.join(args.data_dir, 'trainval' + '_data_weights'), train_weights)
-
-    train_data = np.load(os.path.join(args.data_dir, 'trainval' + '_data_images.npy'))
-    train_labels = np.load(os.path.join(args.data_dir, 'trainval' + '_data_labels.npy'))
-    train_weights = np.load(os.path.join(args.data_dir, 'trainval' + '_data_weights.npy'))
-
-    # eval_data, eval_labels, eval_weights = load_pascal(
-    #     args.data_dir, split='test')
-    #
-    # np.save(os.path.join(args.data_dir, 'test' + '_data_images'), eval_data)
-    # np.save(os.path.join(args.data_dir, 'test' + '_data_labels'), eval_labels)
-    # np.save(os.path.join(args.data_dir, 'test' + '_data_weights'), eval_weights)
-    eval_data = np.load(os.path.join(args.data_dir, 'test' + '_data_images.npy'))
-    eval_labels = np.load(os.path.join(args.data_dir, 'test' + '_data_labels.npy'))
-    eval_weights = np.load(os.path.join(args.data_dir, 'test' + '_data_weights.npy'))
+    # Build the training and eval inputs (store, jpeg or tfrecord)
+    train_input_fn, eval_labels, eval_weights = make_input_fns(
+        args.data_dir, source=args.input, batch_size=BATCH_SIZE,
+        num_workers=args.workers)
 
 
 
+    model_fn = partial(cnn_model_fn, num_classes=eval_labels.shape[1],
+                       precision=args.precision)
+    config = session_config(jit=args.jit)
     pascal_classifier = tf.estimator.Estimator(
-        model_fn=partial(cnn_model_fn,
-                         num_classes=train_labels.shape[1]),
-        model_dir=log_dir)
+        model_fn=model_fn,
+        model_dir=log_dir,
+        config=tf.estimator.RunConfig(session_config=config))
 
     # logging loss
     tensors_to_log = {"loss": "loss"}
@@ -450,45 +401,30 @@ def main():
     # logging_hook2 = tf.train.LoggingTensorHook(
     #     tensors=tensors_to_log2, every_n_iter=100)
 
-    # Train the model
-    train_input_fn = tf.estimator.inputs.numpy_input_fn(
-        x={"x": train_data, "w": train_weights},
-        y=train_labels,
-        batch_size=BATCH_SIZE,
-        num_epochs=None,
-        shuffle=True)
-
-    eval_input_fn = tf.estimator.inputs.numpy_input_fn(
-        x={"x": eval_data, "w": eval_weights},
-        y=eval_labels,
-        num_epochs=1,
-        shuffle=False)
-
-
-    for i in range(no_of_pts):
-        pascal_classifier.train(
-            input_fn=train_input_fn,
-            steps=no_of_steps,
-            hooks=[logging_hook])
-        # Evaluate the model and print results
-        pred = list(pascal_classifier.predict(input_fn=eval_input_fn))
-        pred = np.stack([p['probabilities'] for p in pred])
-        rand_AP = compute_map(
-            eval_labels, np.random.random(eval_labels.shape),
-            eval_weights, average=None)
-
-        print('Random AP: {} mAP'.format(np.mean(rand_AP)))
-        gt_AP = compute_map(
-            eval_labels, eval_labels, eval_weights, average=None)
-        print('GT AP: {} mAP'.format(np.mean(gt_AP)))
-        AP = compute_map(eval_labels, pred, eval_weights, average=None)
-        print('Obtained {} mAP'.format(np.mean(AP)))
-        print('per class:')
-        for cid, cname in enumerate(CLASS_NAMES):
-            print('{}: {}'.format(cname, _get_el(AP, cid)))
+    # Random/GT baselines are computed once for the eval split
+    eval_report = EvalReport(
+        eval_labels, eval_weights, class_names=CLASS_NAMES)
 
+    def report(step, AP):
+        eval_report(AP)
         summary_var(log_dir=log_dir,
-                    name="mAP", val=np.mean(AP), step=i*no_of_steps)
+                    name="mAP", val=np.mean(AP), step=step)
+
+    # Train in a single session and evaluate every no_of_steps steps inside it
+    eval_hook = InProcessEvalHook(
+        model_fn,
+        make_eval_dataset_fn(args.data_dir, source=args.input,
+                             num_workers=args.workers),
+        eval_labels, eval_weights,
+        every_n_steps=no_of_steps, on_eval=report,
+        session_config=config)
+    throughput_hook = ThroughputHook(
+        BATCH_SIZE, every_n_steps=no_of_steps,
+        name='{}{}'.format(args.precision, ' +jit' if args.jit else ''))
+    pascal_classifier.train(
+        input_fn=train_input_fn,
+        steps=no_of_iters,
+        hooks=[throughput_hook, logging_hook, eval_hook])
 
 
     #######  Image logging
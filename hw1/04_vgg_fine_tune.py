@@ -3,16 +3,18 @@ from __future__ import division
 from __future__ import print_function
 
 # Imports
-import os
 import sys
 import numpy as np
 import tensorflow as tf
 import argparse
-import os.path as osp
-from PIL import Image
 from functools import partial
 
-from eval import compute_map
+from eval import EvalReport
+from data import make_input_fns, make_eval_dataset_fn
+from train_eval import InProcessEvalHook, ThroughputHook
+from precision import (LOSS_SCALE, compute_gradients, session_config,
+                       use_mixed_precision)
+from augment import augment_views, center_crop
 #import models
 from tensorflow.core.framework import summary_pb2
 tf.logging.set_verbosity(tf.logging.INFO)
@@ -46,12 +48,34 @@ no_of_iters = 4000
 no_of_pts = 10
 no_of_steps = no_of_iters / no_of_pts
 log_dir = "/home/ubuntu/assignments/04_pascal_fine_tune"
-reader = tf.train.NewCheckpointReader('/home/ubuntu/assignments/vgg_16.ckpt')
+vgg_ckpt = '/home/ubuntu/assignments/vgg_16.ckpt'
 #Local
-# init_path = tf.train.NewCheckpointReader('vgg_16.ckpt')
+# vgg_ckpt = 'vgg_16.ckpt'
+
+# Pretrained layers in the order cnn_model_fn creates them; tf.layers names
+# them conv2d, conv2d_1, ..., conv2d_14
+VGG_LAYERS = [
+    'conv1/conv1_1', 'conv1/conv1_2',
+    'conv2/conv2_1', 'conv2/conv2_2',
+    'conv3/conv3_1', 'conv3/conv3_2', 'conv3/conv3_3',
+    'conv4/conv4_1', 'conv4/conv4_2', 'conv4/conv4_3',
+    'conv5/conv5_1', 'conv5/conv5_2', 'conv5/conv5_3',
+    'fc6', 'fc7',
+]
+
+
+def vgg_assignment_map():
+    """Map vgg_16/... checkpoint names to the cnn_model_fn variables."""
+    assignment_map = {}
+    for i, layer in enumerate(VGG_LAYERS):
+        name = 'conv2d' if i == 0 else 'conv2d_{}'.format(i)
+        assignment_map['vgg_16/{}/weights'.format(layer)] = name + '/kernel'
+        assignment_map['vgg_16/{}/biases'.format(layer)] = name + '/bias'
+    return assignment_map
 
 
-def cnn_model_fn(features, labels, mode, num_classes=20):
+def cnn_model_fn(features, labels, mode, num_classes=20, num_views=1,
+                 precision='fp32'):
     # Write this function
     # Referred :https://github.com/tensorflow/models/blob/master/tutorials/image/mnist/convolutional.py#L243
     # Data Augmentation: https://stackoverflow.com/questions/38920240/tensorflow-image-operations-for-batches
@@ -64,27 +88,19 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
     #
     #
     # norm_imgs = tf.map_fn(lambda frame: tf.image.per_image_standardization(frame), distorted_image)
-    input_layer = tf.reshape(features["x"], [-1, 224, 224, 3])
-
     if mode == tf.estimator.ModeKeys.TRAIN:
-        flipped = tf.map_fn(lambda image: tf.image.random_flip_left_right(image), features["x"])
-        cropped = tf.map_fn(lambda image: tf.random_crop(image, size=[224, 224, 3]), features["x"])
-
-        fets = tf.concat([features["x"], flipped, cropped], axis=0)
-        # wts = tf.concat([features["w"],features["w"],features["w"]],axis = 0)
-        lbls = tf.concat([labels, labels, labels], axis=0)
+        # num_views random crops/flips per image; labels are tiled along
+        # with the images, so they stay aligned by construction
+        input_layer, labels = augment_views(
+            features["x"], labels, num_views=num_views, size=224)
+    else:
+        input_layer = center_crop(features["x"], size=224)
+
+    if precision == 'mixed':
+        # float16 compute on float32 master weights
+        use_mixed_precision()
+        input_layer = tf.cast(input_layer, tf.float16)
 
-        feats = tf.random_shuffle(fets, seed=features["x"].shape[0] * 3)
-        # wtgs = tf.random_shuffle(wts,seed = features["x"].shape[0]*3)
-        lbels = tf.random_shuffle(lbls, seed=features["x"].shape[0] * 3)
-
-        features["x"] = feats
-        input_layer = features["x"]
-        labels = lbels
-
-    # for old_name in reader.get_variable_to_shape_map():
-    #     #print(old_name)
-    #     tensor = reader.get_tensor(old_name)
     ####### BLOCK 1
     # Convolutional Layer #1
 
@@ -95,11 +111,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv1/conv1_1/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv1/conv1_1/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Convolutional Layer #2
     conv2 = tf.layers.conv2d(
@@ -108,11 +120,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv1/conv1_2/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv1/conv1_2/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Pooling Layer #1
     pool1 = tf.layers.max_pooling2d(inputs=conv2, pool_size=[2, 2], strides=2)
@@ -125,11 +133,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv2/conv2_1/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv2/conv2_1/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Convolutional Layer #4
     conv4 = tf.layers.conv2d(
@@ -138,11 +142,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv2/conv2_2/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv2/conv2_2/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Pooling layer 2
     pool2 = tf.layers.max_pooling2d(inputs=conv4, pool_size=[2, 2], strides=2)
@@ -155,11 +155,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv3/conv3_1/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv3/conv3_1/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Convolutional Layer #6
     conv6 = tf.layers.conv2d(
@@ -168,11 +164,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv3/conv3_2/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv3/conv3_2/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Convolutional Layer #7
     conv7 = tf.layers.conv2d(
@@ -181,11 +173,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv3/conv3_3/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv3/conv3_3/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Pooling layer 3
     pool3 = tf.layers.max_pooling2d(inputs=conv7, pool_size=[2, 2], strides=2)
@@ -200,11 +188,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv4/conv4_1/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv4/conv4_1/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Convolutional Layer #9
     conv9 = tf.layers.conv2d(
@@ -213,11 +197,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv4/conv4_2/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv4/conv4_2/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Convolutional Layer #10
     conv10 = tf.layers.conv2d(
@@ -226,11 +206,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv4/conv4_3/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv4/conv4_3/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Pooling layer 4
     pool4 = tf.layers.max_pooling2d(inputs=conv10, pool_size=[2, 2], strides=2)
@@ -243,11 +219,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv5/conv5_1/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv5/conv5_1/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Convolutional Layer #12
     conv12 = tf.layers.conv2d(
@@ -256,11 +228,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv5/conv5_2/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv5/conv5_2/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Convolutional Layer #13
     conv13 = tf.layers.conv2d(
@@ -269,11 +237,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         kernel_size=[3, 3],
         padding="same",
         strides=1,
-        activation=tf.nn.relu,
-        kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv5/conv5_3/weights'),
-                                                   verify_shape=True),
-        bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/conv5/conv5_3/biases'),
-                                                 verify_shape=True))
+        activation=tf.nn.relu)
 
     # Pooling layer 5
     pool5 = tf.layers.max_pooling2d(inputs=conv13, pool_size=[2, 2], strides=2)
@@ -284,11 +248,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
                               filters=4096,  # this specifies the number of channels in the output layer
                               kernel_size=[7, 7],
                               strides=[1, 1],
-                              padding="same",
-                              kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/fc6/weights'),
-                                                                         verify_shape=True),
-                              bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/fc6/biases'),
-                                                                       verify_shape=True))
+                              padding="same")
 
     dropout1 = tf.layers.dropout(
         inputs=dense1, rate=0.5, training=mode == tf.estimator.ModeKeys.TRAIN)
@@ -298,11 +258,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
                               kernel_size=[1, 1],
                               strides=[1, 1],
                               padding="same",
-                              activation=tf.nn.relu,
-                              kernel_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/fc7/weights'),
-                                                                         verify_shape=True),
-                              bias_initializer=tf.constant_initializer(value=reader.get_tensor('vgg_16/fc7/biases'),
-                                                                       verify_shape=True))
+                              activation=tf.nn.relu)
 
     dropout2 = tf.layers.dropout(
         inputs=dense2, rate=0.5, training=mode == tf.estimator.ModeKeys.TRAIN)
@@ -316,6 +272,7 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
 
     # Logits Layer
     logits = tf.layers.dense(inputs=tf.contrib.layers.flatten(dense3), units=20)
+    logits = tf.cast(logits, tf.float32)
 
     probs = tf.sigmoid(logits, name="sigmoid_tensor")
     pred_float = tf.greater_equal(probs, 0.5)
@@ -342,6 +299,11 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
 
     batch_no = tf.Variable(0, dtype=tf.float32)
     if mode == tf.estimator.ModeKeys.TRAIN:
+        # Warm start: the initializers of the pretrained variables read them
+        # from the VGG checkpoint. They only run when model_dir has no
+        # checkpoint yet, and the weights never enter the GraphDef.
+        tf.train.init_from_checkpoint(vgg_ckpt, vgg_assignment_map())
+
         #optimizer = tf.train.GradientDescentOptimizer(learning_rate=0.001)
         learning_rate = tf.train.exponential_decay(
             0.0001,  # Base learning rate.
@@ -357,11 +319,13 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
                                                0.9)
         #summary_var(log_dir=log_dir,
         #            name="learning_rate", val=str(learning_rate), step=tf.train.get_global_step())
-        train_op = optimizer.minimize(
-            loss=loss,
+        grads_and_vars = compute_gradients(
+            optimizer, loss,
+            loss_scale=LOSS_SCALE if precision == 'mixed' else 1.)
+        train_op = optimizer.apply_gradients(
+            grads_and_vars,
             global_step=tf.train.get_global_step())
         train_summary = []
-        grads_and_vars=optimizer.compute_gradients(loss)
         for g, v in grads_and_vars:
             if g is not None:
                 #print(format(v.name))
@@ -387,71 +351,28 @@ def cnn_model_fn(features, labels, mode, num_classes=20):
         mode=mode, loss=loss, eval_metric_ops=eval_metric_ops)
 
 
-def load_pascal(data_dir, split='train'):
-    """
-    Function to read images from PASCAL data folder.
-    Args:
-        data_dir (str): Path to the VOC2007 directory.
-        split (str): train/val/trainval split to use.
-    Returns:
-        images (np.ndarray): Return a np.float32 array of
-            shape (N, H, W, 3), where H, W are 224px each,
-            and each image is in RGB format.
-        labels (np.ndarray): An array of shape (N, 20) of
-            type np.int32, with 0s and 1s; 1s for classes that
-            are active in that image.
-        weights: (np.ndarray): An array of shape (N, 20) of
-            type np.int32, with 0s and 1s; 1s for classes that
-            are confidently labeled and 0s for classes that
-            are ambiguous.
-    """
-    # Wrote this function
-    H = 256
-    W = 256
-
-    N_dict = {'train': 2501, 'val': 2510, 'trainval': 5011, 'test': 4952}
-    N = N_dict[split]
-
-    images = np.zeros((N, H, W, 3), dtype=np.float32)
-    labels = np.zeros((N, num_classes), dtype=np.int32)
-    weights = np.zeros((N, num_classes), dtype=np.int32)
-
-    #Load Images
-    file_name = data_dir + "ImageSets/Main/" + split + '.txt'
-    with open(file_name, 'r') as image_lst_file:
-        i=0
-        for line in image_lst_file.readlines():
-            img_no = line.strip('\n')
-            image_name = data_dir + 'JPEGImages/' + img_no + '.jpg'
-            img = Image.open(image_name)
-            img = img.resize((H, W), Image.ANTIALIAS)
-            imgarr = np.asarray(img, dtype=np.float32)
-            images[i, :, :, :] = imgarr
-            i += 1
-
-    for i in range(len(CLASS_NAMES)):
-        cls = CLASS_NAMES[i]
-        file_name = data_dir + "ImageSets/Main/" + cls + '_' + split + '.txt'
-        with open(file_name, 'r') as image_lst_file:
-            im_idx = 0
-            for line in image_lst_file.readlines():
-                _, is_present = line.strip('\n').split()
-                is_present = int(is_present)
-                if is_present == 1:
-                    labels[im_idx][i] = 1
-
-                if is_present != 0:
-                    weights[im_idx][i] = 1
-                im_idx += 1
-    return images, labels, weights
-
-
 def parse_args():
     parser = argparse.ArgumentParser(
         description='Train a classifier in tensorflow!')
     parser.add_argument(
         'data_dir', type=str, default='data/VOC2007',
         help='Path to PASCAL data storage')
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help='Image decoding processes when building the store (0 = serial)')
+    parser.add_argument(
+        '--input', type=str, default='store',
+        choices=['store', 'jpeg', 'tfrecord'],
+        help='Input pipeline: uint8 memmap store or streaming tf.data')
+    parser.add_argument(
+        '--precision', type=str, default='fp32', choices=['fp32', 'mixed'],
+        help='mixed: float16 compute, float32 weights and loss scaling')
+    parser.add_argument(
+        '--jit', action='store_true',
+        help='Turn on XLA autoclustering')
+    parser.add_argument(
+        '--views', type=int, default=1,
+        help='Augmented views (random crop + flip) of each image per step')
     if len(sys.argv) == 1:
         parser.print_help()
         sys.exit(1)
@@ -486,33 +407,20 @@ def summary_var_lr(log_dir, name, val, step):
 def main():
     args = parse_args()
 
-    # Load training and eval data
-    train_data, train_labels, train_weights = load_pascal(
-         args.data_dir, split='trainval')
-    np.save(os.path.join(args.data_dir, 'trainval' + '_data_images'), train_data)
-    np.save(os.path.join(args.data_dir, 'trainval' + '_data_labels'), train_labels)
-    np.save(os.path.join(args.data_dir, 'trainval' + '_data_weights'), train_weights)
-
-    #train_data = np.load(os.path.join(args.data_dir, 'trainval' + '_data_images.npy'))
-    #train_labels = np.load(os.path.join(args.data_dir, 'trainval' + '_data_labels.npy'))
-    #train_weights = np.load(os.path.join(args.data_dir, 'trainval' + '_data_weights.npy'))
-
-    eval_data, eval_labels, eval_weights = load_pascal(
-        args.data_dir, split='test')
-    
-    np.save(os.path.join(args.data_dir, 'test' + '_data_images'), eval_data)
-    np.save(os.path.join(args.data_dir, 'test' + '_data_labels'), eval_labels)
-    np.save(os.path.join(args.data_dir, 'test' + '_data_weights'), eval_weights)
-    #eval_data = np.load(os.path.join(args.data_dir, 'test' + '_data_images.npy'))
-    #eval_labels = np.load(os.path.join(args.data_dir, 'test' + '_data_labels.npy'))
-    #eval_weights = np.load(os.path.join(args.data_dir, 'test' + '_data_weights.npy'))
+    # Build the training and eval inputs (store, jpeg or tfrecord)
+    train_input_fn, eval_labels, eval_weights = make_input_fns(
+        args.data_dir, source=args.input, batch_size=BATCH_SIZE,
+        num_workers=args.workers)
 
 
 
+    model_fn = partial(cnn_model_fn, num_classes=eval_labels.shape[1],
+                       num_views=args.views, precision=args.precision)
+    config = session_config(jit=args.jit)
     pascal_classifier = tf.estimator.Estimator(
-        model_fn=partial(cnn_model_fn,
-                         num_classes=train_labels.shape[1]),
-        model_dir=log_dir)
+        model_fn=model_fn,
+        model_dir=log_dir,
+        config=tf.estimator.RunConfig(session_config=config))
 
     # logging loss
     tensors_to_log = {"loss": "loss"}
@@ -529,45 +437,30 @@ def main():
     # logging_hook2 = tf.train.LoggingTensorHook(
     #     tensors=tensors_to_log2, every_n_iter=100)
 
-    # Train the model
-    train_input_fn = tf.estimator.inputs.numpy_input_fn(
-        x={"x": train_data, "w": train_weights},
-        y=train_labels,
-        batch_size=BATCH_SIZE,
-        num_epochs=None,
-        shuffle=True)
-
-    eval_input_fn = tf.estimator.inputs.numpy_input_fn(
-        x={"x": eval_data, "w": eval_weights},
-        y=eval_labels,
-        num_epochs=1,
-        shuffle=False)
-
-
-    for i in range(no_of_pts):
-        pascal_classifier.train(
-            input_fn=train_input_fn,
-            steps=no_of_steps,
-            hooks=[logging_hook])
-        # Evaluate the model and print results
-        pred = list(pascal_classifier.predict(input_fn=eval_input_fn))
-        pred = np.stack([p['probabilities'] for p in pred])
-        rand_AP = compute_map(
-            eval_labels, np.random.random(eval_labels.shape),
-            eval_weights, average=None)
-
-        print('Random AP: {} mAP'.format(np.mean(rand_AP)))
-        gt_AP = compute_map(
-            eval_labels, eval_labels, eval_weights, average=None)
-        print('GT AP: {} mAP'.format(np.mean(gt_AP)))
-        AP = compute_map(eval_labels, pred, eval_weights, average=None)
-        print('Obtained {} mAP'.format(np.mean(AP)))
-        print('per class:')
-        for cid, cname in enumerate(CLASS_NAMES):
-            print('{}: {}'.format(cname, _get_el(AP, cid)))
+    # Random/GT baselines are computed once for the eval split
+    eval_report = EvalReport(
+        eval_labels, eval_weights, class_names=CLASS_NAMES)
 
+    def report(step, AP):
+        eval_report(AP)
         summary_var(log_dir=log_dir,
-                    name="mAP", val=np.mean(AP), step=i*no_of_steps)
+                    name="mAP", val=np.mean(AP), step=step)
+
+    # Train in a single session and evaluate every no_of_steps steps inside it
+    eval_hook = InProcessEvalHook(
+        model_fn,
+        make_eval_dataset_fn(args.data_dir, source=args.input,
+                             num_workers=args.workers),
+        eval_labels, eval_weights,
+        every_n_steps=no_of_steps, on_eval=report,
+        session_config=config)
+    throughput_hook = ThroughputHook(
+        BATCH_SIZE * args.views, every_n_steps=no_of_steps,
+        name='{}{}'.format(args.precision, ' +jit' if args.jit else ''))
+    pascal_classifier.train(
+        input_fn=train_input_fn,
+        steps=no_of_iters,
+        hooks=[throughput_hook, logging_hook, eval_hook])
 
 
     #######  Image logging
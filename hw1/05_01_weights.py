@@ -3,40 +3,88 @@ from __future__ import division
 from __future__ import print_function
 
 # Imports
+import io
 import os
 import sys
+import time
 import numpy as np
 import tensorflow as tf
 import argparse
 import os.path as osp
 from PIL import Image
-from functools import partial
 
-from eval import compute_map
 #import models
 from tensorflow.core.framework import summary_pb2
 from funcs import *
-import tensorflow as tf
 tf.logging.set_verbosity(tf.logging.INFO)
 
-readerf = tf.train.NewCheckpointReader("/tmp/02_pascal_model_scratch_bak/model.ckpt-40000")
 
-f = readerf.get_tensor("conv2d/kernel")
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Render the conv kernels of a checkpoint')
+    parser.add_argument(
+        'checkpoint', type=str, nargs='?',
+        default='/tmp/02_pascal_model_scratch_bak/model.ckpt-40000',
+        help='Checkpoint prefix or directory (latest checkpoint is used)')
+    parser.add_argument(
+        '--out_dir', type=str, default='./fit',
+        help='Where the PNGs and the TensorBoard events are written')
+    parser.add_argument(
+        '--pad', type=int, default=1,
+        help='Black pixels around each filter')
+    return parser.parse_args()
 
 
-final_filt=put_kernels_on_grid (tf.convert_to_tensor(f), pad = 1)
+def conv_kernel_names(reader):
+    """Names of the 4-D (conv) weight tensors, without reading any of them."""
+    shapes = reader.get_variable_to_shape_map()
+    return sorted(name for name, shape in shapes.items()
+                  if len(shape) == 4 and
+                  name.split('/')[-1] in ('kernel', 'weights'))
 
 
-im_summary=tf.summary.image('final_filt', final_filt)
+def image_summary_value(tag, image):
+    """Summary.Value holding a uint8 [H, W, C] image as PNG."""
+    buf = io.BytesIO()
+    Image.fromarray(image.squeeze(axis=2) if image.shape[2] == 1
+                    else image).save(buf, format='PNG')
+    png = buf.getvalue()
+    value = summary_pb2.Summary.Value(tag=tag)
+    value.image.height = image.shape[0]
+    value.image.width = image.shape[1]
+    value.image.colorspace = image.shape[2]
+    value.image.encoded_image_string = png
+    return value, png
 
 
-all_summary = tf.summary.merge([im_summary])
+def main():
+    args = parse_args()
+    checkpoint = args.checkpoint
+    if osp.isdir(checkpoint):
+        checkpoint = tf.train.latest_checkpoint(checkpoint)
+    if not osp.isdir(args.out_dir):
+        os.makedirs(args.out_dir)
 
+    start = time.time()
+    reader = tf.train.NewCheckpointReader(checkpoint)
+    summary = summary_pb2.Summary()
+    # One tensor in memory at a time; rendering and encoding are NumPy/PIL
+    for name in conv_kernel_names(reader):
+        image = kernel_image(reader.get_tensor(name), pad=args.pad)
+        value, png = image_summary_value(name, image)
+        summary.value.extend([value])
+        file_name = osp.join(args.out_dir, name.replace('/', '_') + '.png')
+        with open(file_name, 'wb') as f:
+            f.write(png)
+        print('{}: {}x{} -> {}'.format(name, image.shape[0], image.shape[1],
+                                       file_name))
 
-with tf.Session() as sess:
-    summary = sess.run(all_summary)
-    writer = tf.summary.FileWriter('./fit')
+    writer = tf.summary.FileWriter(args.out_dir)
     writer.add_summary(summary)
     writer.close()
+    print('Rendered {} kernels in {:.1f}s'.format(len(summary.value),
+                                                  time.time() - start))
 
 
+if __name__ == "__main__":
+    main()
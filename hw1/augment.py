@@ -0,0 +1,98 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+def random_crop_and_flip(images, size=224, flip=True, seed=None):
+    """
+    Batched random crop + random left/right flip in a single op.
+    Per-sample crop offsets and flip masks are drawn as tensors and applied
+    with one tf.image.crop_and_resize, instead of tf.map_fn over
+    tf.random_crop / tf.image.random_flip_left_right one image at a time.
+    Offsets are uniform over every valid position and each image is flipped
+    with probability 0.5, as with the per-image ops. Boxes land exactly on
+    pixel centres, so the crops are copies of the input pixels.
+    Args:
+        images (tf.Tensor): float32 (B, H, W, C) with H, W known statically.
+        size (int): Side of the square crop.
+        flip (bool): Also flip each image left/right at random.
+    Returns:
+        float32 (B, size, size, C)
+    """
+    shape = images.get_shape().as_list()
+    height, width = shape[1], shape[2]
+    batch = tf.shape(images)[0]
+
+    # Offsets in [0, H - size], like tf.random_crop
+    y = tf.random_uniform([batch], maxval=height - size + 1, dtype=tf.int32,
+                          seed=seed)
+    x = tf.random_uniform([batch], maxval=width - size + 1, dtype=tf.int32,
+                          seed=None if seed is None else seed + 1)
+    y = tf.to_float(y)
+    x = tf.to_float(x)
+    y1 = y / (height - 1)
+    y2 = (y + size - 1) / (height - 1)
+    x1 = x / (width - 1)
+    x2 = (x + size - 1) / (width - 1)
+    if flip:
+        # Swapping x1 and x2 makes crop_and_resize sample right to left.
+        # Flipping the crop at x equals cropping the flipped image at
+        # W - size - x, which is drawn with the same probability
+        mask = tf.random_uniform([batch],
+                                 seed=None if seed is None else seed + 2) < 0.5
+        x1, x2 = tf.where(mask, x2, x1), tf.where(mask, x1, x2)
+
+    boxes = tf.stack([y1, x1, y2, x2], axis=1)
+    return tf.image.crop_and_resize(images, boxes, tf.range(batch),
+                                    [size, size])
+
+
+def random_flip(images, seed=None):
+    """Batched tf.image.random_flip_left_right: one flip mask per image."""
+    mask = tf.random_uniform([tf.shape(images)[0]], seed=seed) < 0.5
+    return tf.where(mask, tf.reverse(images, axis=[2]), images)
+
+
+def standardize(images):
+    """Batched tf.image.per_image_standardization over (B, H, W, C)."""
+    images = tf.to_float(images)
+    mean, variance = tf.nn.moments(images, axes=[1, 2, 3], keep_dims=True)
+    num_pixels = tf.to_float(tf.reduce_prod(tf.shape(images)[1:]))
+    stddev = tf.maximum(tf.sqrt(variance), tf.rsqrt(num_pixels))
+    return (images - mean) / stddev
+
+
+def augment(images, size=224, flip=True, normalize=False, seed=None):
+    """random_crop_and_flip followed, optionally, by standardize."""
+    images = random_crop_and_flip(images, size=size, flip=flip, seed=seed)
+    if normalize:
+        images = standardize(images)
+    return images
+
+
+def augment_views(images, labels, num_views=1, size=224, flip=True,
+                  normalize=False, seed=None):
+    """
+    num_views independently cropped/flipped views of every image.
+    The batch is tiled view-major and labels are tiled the same way, so
+    row i of the result always belongs to image i % B and no shuffle is
+    needed to keep the two aligned.
+    Returns:
+        (images (B * num_views, size, size, C), labels (B * num_views, ...))
+    """
+    if num_views > 1:
+        images = tf.tile(images, [num_views, 1, 1, 1])
+        labels = tf.tile(labels, [num_views, 1])
+    images = augment(images, size=size, flip=flip, normalize=normalize,
+                     seed=seed)
+    return images, labels
+
+
+def center_crop(images, size=224):
+    """Deterministic central size x size crop of a (B, H, W, C) batch."""
+    shape = images.get_shape().as_list()
+    top = (shape[1] - size) // 2
+    left = (shape[2] - size) // 2
+    return images[:, top:top + size, left:left + size, :]
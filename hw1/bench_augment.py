@@ -0,0 +1,64 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# Benchmark of augment.augment against the per-image tf.map_fn
+# augmentation it replaced in the hw1 model_fns.
+# Usage: python bench_augment.py [BATCH_SIZE ...]
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+
+from augment import augment
+
+
+def augment_map_fn(images, size=224, normalize=False):
+    flipped = tf.map_fn(
+        lambda img: tf.image.random_flip_left_right(img), images)
+    cropped = tf.map_fn(
+        lambda img: tf.random_crop(img, [size, size, 3]), flipped)
+    if normalize:
+        cropped = tf.map_fn(
+            lambda img: tf.image.per_image_standardization(img), cropped)
+    return cropped
+
+
+def _images_per_sec(sess, op, batch_size, warmup=3, repeat=20):
+    for _ in range(warmup):
+        sess.run(op)
+    start = time.time()
+    for _ in range(repeat):
+        sess.run(op)
+    return batch_size * repeat / (time.time() - start)
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [10, 64, 256]
+    rng = np.random.RandomState(0)
+    for batch_size in sizes:
+        data = rng.randint(0, 256, size=(batch_size, 256, 256, 3))
+        with tf.Graph().as_default():
+            # A variable keeps the input on the device between runs
+            images = tf.Variable(data.astype(np.float32), trainable=False)
+            ops = [(name, normalize, tf.reduce_sum(fn(images,
+                                                      normalize=normalize)))
+                   for name, fn in [('map_fn', augment_map_fn),
+                                    ('batched', augment)]
+                   for normalize in [False, True]]
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                rates = {}
+                for name, normalize, op in ops:
+                    rates[name, normalize] = _images_per_sec(
+                        sess, op, batch_size)
+        for normalize in [False, True]:
+            old = rates[('map_fn', normalize)]
+            new = rates[('batched', normalize)]
+            print('B={:>4d}  standardize={:<5}  map_fn {:8.1f} img/s  '
+                  'batched {:8.1f} img/s  speedup {:.1f}x'.format(
+                      batch_size, str(normalize), old, new, new / old))
+
+
+if __name__ == '__main__':
+    main()
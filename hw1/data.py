@@ -0,0 +1,507 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import os.path as osp
+import sys
+import glob
+import hashlib
+import multiprocessing
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+
+CLASS_NAMES = [
+    'aeroplane',
+    'bicycle',
+    'bird',
+    'boat',
+    'bottle',
+    'bus',
+    'car',
+    'cat',
+    'chair',
+    'cow',
+    'diningtable',
+    'dog',
+    'horse',
+    'motorbike',
+    'person',
+    'pottedplant',
+    'sheep',
+    'sofa',
+    'train',
+    'tvmonitor',
+]
+
+num_classes = 20
+H = 256
+W = 256
+
+
+def _image_index(data_dir, split):
+    file_name = osp.join(data_dir, 'ImageSets', 'Main', split + '.txt')
+    with open(file_name, 'r') as image_lst_file:
+        return [line.strip('\n') for line in image_lst_file.readlines()]
+
+
+def _decode_image(data_dir, img_no):
+    image_name = osp.join(data_dir, 'JPEGImages', img_no + '.jpg')
+    img = Image.open(image_name)
+    img = img.resize((H, W), Image.ANTIALIAS)
+    return np.asarray(img, dtype=np.uint8)
+
+
+def _decode_chunk(args):
+    """Decode images [start, end) straight into the shared work file."""
+    data_dir, work_file, img_nos, start = args
+    images = np.load(work_file, mmap_mode='r+')
+    for i, img_no in enumerate(img_nos):
+        images[start + i, :, :, :] = _decode_image(data_dir, img_no)
+    images.flush()
+    del images
+    return start + len(img_nos)
+
+
+def _read_checkpoint(ckpt_file):
+    try:
+        with open(ckpt_file, 'r') as f:
+            return int(f.read().strip())
+    except (IOError, OSError, ValueError):
+        return 0
+
+
+def _write_checkpoint(ckpt_file, done):
+    tmp_file = ckpt_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write('%d\n' % done)
+    os.rename(tmp_file, ckpt_file)
+
+
+def _open_work_file(work_file, ckpt_file, N):
+    """Reopen a partially decoded split, or start a fresh one."""
+    if osp.exists(work_file) and osp.exists(ckpt_file):
+        images = np.load(work_file, mmap_mode='r+')
+        if images.shape == (N, H, W, 3) and images.dtype == np.uint8:
+            return images, min(_read_checkpoint(ckpt_file), N)
+        del images
+    images = np.lib.format.open_memmap(
+        work_file, mode='w+', dtype=np.uint8, shape=(N, H, W, 3))
+    _write_checkpoint(ckpt_file, 0)
+    return images, 0
+
+
+def _decode_split(data_dir, split, img_nos, out_file, num_workers,
+                  cache_dir=None, chunk_size=64):
+    """Decode a split to a uint8 (N, H, W, 3) .npy file at out_file."""
+    N = len(img_nos)
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if cache_dir is None:
+        cache_dir = data_dir
+    work_file = osp.join(cache_dir, split + '_decode.npy')
+    ckpt_file = osp.join(cache_dir, split + '_decode.ckpt')
+
+    images, done = _open_work_file(work_file, ckpt_file, N)
+    if done > 0:
+        print('load_pascal: resuming {} from image {}/{}'.format(
+            split, done, N))
+
+    chunks = [(data_dir, work_file, img_nos[s:s + chunk_size], s)
+              for s in range(done, N, chunk_size)]
+    if num_workers > 0 and len(chunks) > 1:
+        # Flush our view so the workers see a consistent file
+        images.flush()
+        pool = multiprocessing.Pool(num_workers)
+        results = pool.imap(_decode_chunk, chunks)
+    else:
+        pool = None
+        results = (_decode_chunk(c) for c in chunks)
+
+    try:
+        # imap yields in submission order, so the checkpoint only ever
+        # covers a contiguous prefix of fully written images
+        for done in results:
+            _write_checkpoint(ckpt_file, done)
+            sys.stdout.write('\rload_pascal: {} {}/{} images'.format(
+                split, done, N))
+            sys.stdout.flush()
+        sys.stdout.write('\n')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    del images
+    os.rename(work_file, out_file)
+    os.remove(ckpt_file)
+
+
+def _class_files(data_dir, split):
+    return [osp.join(data_dir, 'ImageSets', 'Main', cls + '_' + split + '.txt')
+            for cls in CLASS_NAMES]
+
+
+def _annotations_file(cache_dir, data_dir, split):
+    """Cache file name, keyed on the split and the annotation file mtimes."""
+    files = [osp.join(data_dir, 'ImageSets', 'Main', split + '.txt')]
+    files += _class_files(data_dir, split)
+    key = hashlib.sha1(repr(
+        [split] + [os.stat(f).st_mtime for f in files]).encode('utf-8'))
+    return osp.join(cache_dir, '{}_annotations_{}.npy'.format(
+        split, key.hexdigest()[:12]))
+
+
+def _parse_annotations(data_dir, split):
+    img_nos = np.array(_image_index(data_dir, split))
+    order = np.argsort(img_nos)
+    sorted_nos = img_nos[order]
+    annotations = np.zeros((len(img_nos), num_classes, 2), dtype=np.int8)
+
+    for i, file_name in enumerate(_class_files(data_dir, split)):
+        rows = np.loadtxt(file_name, ndmin=1,
+                          dtype=[('id', sorted_nos.dtype), ('flag', np.int8)])
+        # Join on the image id rather than trusting the line order
+        pos = np.minimum(np.searchsorted(sorted_nos, rows['id']),
+                         len(sorted_nos) - 1)
+        found = sorted_nos[pos] == rows['id']
+        if not found.all() or len(rows) != len(img_nos):
+            raise ValueError('{} does not list the images of {}.txt'.format(
+                file_name, split))
+        idx = order[pos]
+        annotations[idx, i, 0] = rows['flag'] == 1
+        annotations[idx, i, 1] = rows['flag'] != 0
+    return annotations
+
+
+def load_pascal_annotations(data_dir, split='train', cache_dir=None):
+    """
+    Labels and weights of a split as one int8 array of shape (N, 20, 2),
+    [..., 0] being the labels and [..., 1] the weights. All 20 class files
+    are parsed in bulk and joined to the image list by image id. The result
+    is cached in cache_dir (defaults to data_dir) and memory-mapped from
+    there until the split or class files change.
+    """
+    if cache_dir is None:
+        cache_dir = data_dir
+    cache_file = _annotations_file(cache_dir, data_dir, split)
+    if not osp.exists(cache_file):
+        annotations = _parse_annotations(data_dir, split)
+        for stale in glob.glob(osp.join(cache_dir,
+                                        split + '_annotations_*.npy')):
+            os.remove(stale)
+        tmp_file = cache_file + '.tmp.npy'
+        np.save(tmp_file, annotations)
+        os.rename(tmp_file, cache_file)
+    return np.load(cache_file, mmap_mode='r')
+
+
+def _load_labels(data_dir, split, N):
+    annotations = load_pascal_annotations(data_dir, split)
+    assert annotations.shape[0] == N, \
+        'Got annotations for {} of {} images'.format(annotations.shape[0], N)
+    labels = annotations[:, :, 0].astype(np.int32)
+    weights = annotations[:, :, 1].astype(np.int32)
+    return labels, weights
+
+
+def load_pascal_labels(data_dir, split='train'):
+    """Return the (N, 20) labels and weights of a split, as in load_pascal."""
+    N = len(_image_index(data_dir, split))
+    return _load_labels(data_dir, split, N)
+
+
+def load_pascal(data_dir, split='train', num_workers=None, cache_dir=None,
+                chunk_size=64):
+    """
+    Function to read images from PASCAL data folder.
+    Args:
+        data_dir (str): Path to the VOC2007 directory.
+        split (str): train/val/trainval split to use.
+        num_workers (int): Number of decoding processes. None uses one per
+            CPU, 0 decodes serially in this process.
+        cache_dir (str): Where the partially decoded images and the resume
+            checkpoint are kept. Defaults to data_dir. An interrupted call
+            picks up from the last checkpointed image.
+        chunk_size (int): Images decoded per task; the checkpoint advances
+            one chunk at a time.
+    Returns:
+        images (np.ndarray): Return a np.float32 array of
+            shape (N, H, W, 3), where H, W are 256px each,
+            and each image is in RGB format.
+        labels (np.ndarray): An array of shape (N, 20) of
+            type np.int32, with 0s and 1s; 1s for classes that
+            are active in that image.
+        weights: (np.ndarray): An array of shape (N, 20) of
+            type np.int32, with 0s and 1s; 1s for classes that
+            are confidently labeled and 0s for classes that
+            are ambiguous.
+    """
+    if cache_dir is None:
+        cache_dir = data_dir
+    img_nos = _image_index(data_dir, split)
+    N = len(img_nos)
+
+    out_file = osp.join(cache_dir, split + '_decode_done.npy')
+    _decode_split(data_dir, split, img_nos, out_file, num_workers,
+                  cache_dir=cache_dir, chunk_size=chunk_size)
+    images = np.load(out_file).astype(np.float32)
+    os.remove(out_file)
+    labels, weights = _load_labels(data_dir, split, N)
+    return images, labels, weights
+
+
+def _store_files(store_dir, split):
+    return (osp.join(store_dir, split + '_data_images_u8.npy'),
+            osp.join(store_dir, split + '_data_labels.npy'),
+            osp.join(store_dir, split + '_data_weights.npy'))
+
+
+def load_pascal_store(data_dir, split='train', num_workers=None,
+                      store_dir=None):
+    """
+    Open a split from the on-disk uint8 store, building it on first use.
+    The images are decoded once (see load_pascal) and kept as a uint8 .npy
+    file, which is memory-mapped read-only here instead of being loaded.
+    Args:
+        data_dir (str): Path to the VOC2007 directory.
+        split (str): train/val/trainval/test split to use.
+        num_workers (int): Decoding processes used when building the store.
+        store_dir (str): Where the store lives. Defaults to data_dir.
+    Returns:
+        images (np.memmap): Read-only np.uint8 array of shape (N, H, W, 3).
+        labels (np.ndarray): (N, 20) np.int32 array, as in load_pascal.
+        weights (np.ndarray): (N, 20) np.int32 array, as in load_pascal.
+    """
+    if store_dir is None:
+        store_dir = data_dir
+    images_file, labels_file, weights_file = _store_files(store_dir, split)
+
+    # The images file is written last, so its presence marks a full store
+    if not osp.exists(images_file):
+        img_nos = _image_index(data_dir, split)
+        labels, weights = _load_labels(data_dir, split, len(img_nos))
+        np.save(labels_file, labels)
+        np.save(weights_file, weights)
+        _decode_split(data_dir, split, img_nos, images_file, num_workers,
+                      cache_dir=store_dir)
+
+    images = np.load(images_file, mmap_mode='r')
+    labels = np.load(labels_file)
+    weights = np.load(weights_file)
+    return images, labels, weights
+
+
+def pascal_input_fn(images, labels, weights, **kwargs):
+    """
+    numpy_input_fn over store arrays. Only the sampled rows of the uint8
+    memmap are read, and they are cast to float32 inside the graph.
+    kwargs are passed through to tf.estimator.inputs.numpy_input_fn.
+    """
+    numpy_fn = tf.estimator.inputs.numpy_input_fn(
+        x={"x": images, "w": weights}, y=labels, **kwargs)
+
+    def input_fn():
+        features, targets = numpy_fn()
+        features["x"] = tf.to_float(features["x"])
+        return features, targets
+    return input_fn
+
+
+def _tfrecord_pattern(record_dir, split):
+    return osp.join(record_dir, split + '-*-of-*.tfrecord')
+
+
+def write_pascal_tfrecords(data_dir, split='train', record_dir=None,
+                           num_shards=16):
+    """
+    Write a split as sharded TFRecords of the original JPEG bytes plus the
+    label and weight vectors. Nothing is decoded here; the JPEGs are decoded
+    by the tf.data pipeline in pascal_dataset_input_fn.
+    """
+    if record_dir is None:
+        record_dir = data_dir
+    img_nos = _image_index(data_dir, split)
+    labels, weights = _load_labels(data_dir, split, len(img_nos))
+
+    for shard in range(num_shards):
+        file_name = osp.join(record_dir, '{}-{:05d}-of-{:05d}.tfrecord'.format(
+            split, shard, num_shards))
+        with tf.python_io.TFRecordWriter(file_name) as writer:
+            for i in range(shard, len(img_nos), num_shards):
+                image_name = osp.join(data_dir, 'JPEGImages',
+                                      img_nos[i] + '.jpg')
+                with open(image_name, 'rb') as f:
+                    encoded = f.read()
+                example = tf.train.Example(features=tf.train.Features(feature={
+                    'image': tf.train.Feature(
+                        bytes_list=tf.train.BytesList(value=[encoded])),
+                    'label': tf.train.Feature(
+                        int64_list=tf.train.Int64List(value=labels[i].tolist())),
+                    'weight': tf.train.Feature(
+                        int64_list=tf.train.Int64List(value=weights[i].tolist())),
+                }))
+                writer.write(example.SerializeToString())
+
+
+def _decode_jpeg(encoded):
+    image = tf.image.decode_jpeg(encoded, channels=3)
+    # AREA is TF's closest match to the PIL ANTIALIAS downsizing above
+    image = tf.image.resize_images(image, [H, W],
+                                   method=tf.image.ResizeMethod.AREA)
+    image.set_shape([H, W, 3])
+    return image
+
+
+def _parse_example(serialized):
+    parsed = tf.parse_single_example(serialized, features={
+        'image': tf.FixedLenFeature([], tf.string),
+        'label': tf.FixedLenFeature([num_classes], tf.int64),
+        'weight': tf.FixedLenFeature([num_classes], tf.int64),
+    })
+    image = _decode_jpeg(parsed['image'])
+    weight = tf.to_int32(parsed['weight'])
+    return {"x": image, "w": weight}, tf.to_int32(parsed['label'])
+
+
+def _parse_jpeg(file_name, label, weight):
+    image = _decode_jpeg(tf.read_file(file_name))
+    return {"x": image, "w": weight}, label
+
+
+def pascal_dataset_fn(data_dir, split='train', batch_size=128,
+                      num_epochs=None, shuffle=True, source='jpeg',
+                      record_dir=None, shuffle_buffer=1000,
+                      num_parallel_calls=None, prefetch=2):
+    """
+    Streaming tf.data pipeline for a PASCAL split.
+    Args:
+        data_dir (str): Path to the VOC2007 directory.
+        split (str): train/val/trainval/test split to use.
+        source (str): 'jpeg' reads the JPEGImages files directly, 'tfrecord'
+            reads the shards from write_pascal_tfrecords (written on first
+            use if none exist in record_dir).
+        shuffle_buffer (int): Examples held in the shuffle buffer.
+        num_parallel_calls (int): Parallel decode calls. Defaults to the
+            number of CPUs.
+        prefetch (int): Batches prefetched ahead of the model.
+    Returns:
+        A function that builds the tf.data.Dataset in the current graph. It
+        yields ({"x": float32 (B, H, W, 3), "w": int32 (B, 20)}, int32 (B, 20)
+        labels), like pascal_input_fn.
+    """
+    if num_parallel_calls is None:
+        num_parallel_calls = multiprocessing.cpu_count()
+    if record_dir is None:
+        record_dir = data_dir
+
+    if source == 'tfrecord':
+        if not tf.gfile.Glob(_tfrecord_pattern(record_dir, split)):
+            write_pascal_tfrecords(data_dir, split, record_dir=record_dir)
+        shards = sorted(tf.gfile.Glob(_tfrecord_pattern(record_dir, split)))
+    elif source == 'jpeg':
+        img_nos = _image_index(data_dir, split)
+        file_names = [osp.join(data_dir, 'JPEGImages', img_no + '.jpg')
+                      for img_no in img_nos]
+        labels, weights = _load_labels(data_dir, split, len(img_nos))
+    else:
+        raise ValueError('Unknown input source: {}'.format(source))
+
+    def dataset_fn():
+        if source == 'tfrecord':
+            dataset = tf.data.Dataset.from_tensor_slices(shards)
+            if shuffle:
+                dataset = dataset.shuffle(len(shards))
+            dataset = dataset.interleave(
+                tf.data.TFRecordDataset,
+                cycle_length=min(len(shards), num_parallel_calls))
+            parse_fn = _parse_example
+        else:
+            dataset = tf.data.Dataset.from_tensor_slices(
+                (file_names, labels, weights))
+            parse_fn = _parse_jpeg
+        if shuffle:
+            dataset = dataset.shuffle(shuffle_buffer)
+        dataset = dataset.repeat(num_epochs)
+        dataset = dataset.map(parse_fn, num_parallel_calls=num_parallel_calls)
+        dataset = dataset.batch(batch_size)
+        return dataset.prefetch(prefetch)
+    return dataset_fn
+
+
+def pascal_dataset_input_fn(*args, **kwargs):
+    """input_fn over the dataset of pascal_dataset_fn(*args, **kwargs)."""
+    dataset_fn = pascal_dataset_fn(*args, **kwargs)
+
+    def input_fn():
+        return dataset_fn().make_one_shot_iterator().get_next()
+    return input_fn
+
+
+def store_dataset_fn(images, labels, weights, batch_size=128):
+    """
+    One in-order pass over store arrays as a tf.data.Dataset, with the same
+    structure as pascal_dataset_fn. Batches are read from the memmap and
+    cast to float32 one at a time.
+    """
+    def generator():
+        for start in range(0, images.shape[0], batch_size):
+            end = start + batch_size
+            yield ({"x": images[start:end].astype(np.float32),
+                    "w": weights[start:end]}, labels[start:end])
+
+    def dataset_fn():
+        return tf.data.Dataset.from_generator(
+            generator,
+            ({"x": tf.float32, "w": tf.int32}, tf.int32),
+            ({"x": tf.TensorShape([None, H, W, 3]),
+              "w": tf.TensorShape([None, num_classes])},
+             tf.TensorShape([None, num_classes])))
+    return dataset_fn
+
+
+def make_input_fns(data_dir, source='store', batch_size=10,
+                   num_workers=None):
+    """
+    Build the train input_fn (trainval, shuffled, repeated) for the hw1
+    scripts, and the labels and weights of the test split that
+    train_eval.InProcessEvalHook evaluates on (its input comes from
+    make_eval_dataset_fn).
+    Args:
+        source (str): 'store' feeds from the uint8 memmap store, 'jpeg' and
+            'tfrecord' stream through pascal_dataset_input_fn.
+    Returns:
+        train_input_fn, eval_labels, eval_weights
+    """
+    if source == 'store':
+        train_data, train_labels, train_weights = load_pascal_store(
+            data_dir, split='trainval', num_workers=num_workers)
+        train_input_fn = pascal_input_fn(
+            train_data, train_labels, train_weights,
+            batch_size=batch_size,
+            num_epochs=None,
+            shuffle=True)
+    else:
+        train_input_fn = pascal_dataset_input_fn(
+            data_dir, split='trainval', batch_size=batch_size,
+            num_epochs=None, shuffle=True, source=source)
+    # Same order as the store (and the test dataset of make_eval_dataset_fn)
+    eval_labels, eval_weights = load_pascal_labels(data_dir, split='test')
+    return train_input_fn, eval_labels, eval_weights
+
+
+def make_eval_dataset_fn(data_dir, source='store', batch_size=128,
+                         num_workers=None):
+    """
+    dataset_fn for one in-order pass over the test split, for evaluating
+    inside a running training session (see train_eval.InProcessEvalHook).
+    """
+    if source == 'store':
+        eval_data, eval_labels, eval_weights = load_pascal_store(
+            data_dir, split='test', num_workers=num_workers)
+        return store_dataset_fn(eval_data, eval_labels, eval_weights,
+                                batch_size=batch_size)
+    return pascal_dataset_fn(data_dir, split='test', batch_size=batch_size,
+                             num_epochs=1, shuffle=False, source=source)
@@ -1,4 +1,57 @@
-import sklearn.metrics
+import hashlib
+import numpy as np
+
+
+def average_precision(gt, pred, valid=None, eps=1e-5):
+    """
+    Per-class average precision for all columns at once.
+    Gives the same values as calling sklearn.metrics.average_precision_score
+    on each column (restricted to its valid rows), but sorts every column in
+    a single argsort and computes all the APs in one batched pass.
+    gt (np.ndarray): Shape NxC, 0 or 1.
+    pred (np.ndarray): Shape NxC, scores.
+    valid (np.ndarray): Shape NxC, 0 to ignore that entry. None keeps all.
+    eps (float): Subtracted from the score of positives so that tied scores
+        are ranked pessimistically (as in PhilK.'s code).
+    Returns:
+        np.ndarray of shape (C,); nan for classes without valid positives.
+    """
+    # Work on (C, N) so that every class is a contiguous row
+    gt = np.asarray(gt).T.astype(np.float32)
+    scores = np.asarray(pred).T.astype(np.float32)
+    scores -= np.float32(eps) * gt
+    if valid is not None:
+        valid = np.asarray(valid).T > 0
+        # Ignored entries sink below every valid score as negatives, where
+        # they can no longer change recall and so add nothing to the AP
+        gt[~valid] = 0
+        scores[~valid] = -np.inf
+
+    C, N = gt.shape
+    # The order inside a run of tied scores does not matter, since
+    # precision is only evaluated at the end of each run
+    order = np.argsort(-scores, axis=1)
+    order += np.arange(C)[:, np.newaxis] * N
+    scores = np.take(scores, order)
+    gt = np.take(gt, order)
+    num_pos = gt.sum(axis=1, dtype=np.float64)
+
+    is_last = np.ones((C, N), dtype=bool)
+    is_last[:, :-1] = scores[:, :-1] != scores[:, 1:]
+    cls = np.broadcast_to(np.arange(C)[:, np.newaxis], (C, N))[is_last]
+    idx = np.broadcast_to(np.arange(N), (C, N))[is_last]
+    tps = np.cumsum(gt, axis=1, dtype=np.float64)[is_last]
+    precision = tps / (idx + 1)
+
+    # Recall gained at each run end, restarting at every new class
+    delta = tps.copy()
+    delta[1:] -= tps[:-1]
+    first = np.ones(len(cls), dtype=bool)
+    first[1:] = cls[1:] != cls[:-1]
+    delta[first] = tps[first]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.bincount(cls, weights=delta * precision, minlength=C) / num_pos
 
 
 def compute_map(gt, pred, valid, average=None):
@@ -11,15 +64,152 @@ def compute_map(gt, pred, valid, average=None):
     valid (np.ndarray): Shape Nx20, 0 if you want to ignore that class for that
         image. Some objects are labeled as ambiguous.
     """
-    nclasses = gt.shape[1]
-    all_ap = []
-    for cid in range(nclasses):
-        gt_cls = gt[:, cid][valid[:, cid] > 0].astype('float32')
-        pred_cls = pred[:, cid][valid[:, cid] > 0].astype('float32')
-        # As per PhilK. code:
-        # https://github.com/philkr/voc-classification/blob/master/src/train_cls.py
-        pred_cls -= 1e-5 * gt_cls
-        ap = sklearn.metrics.average_precision_score(
-            gt_cls, pred_cls, average=average)
-        all_ap.append(ap)
-    return all_ap
+    # As per PhilK. code:
+    # https://github.com/philkr/voc-classification/blob/master/src/train_cls.py
+    # average is kept for compatibility; APs are always per class
+    return list(average_precision(gt, pred, valid))
+
+
+class APAccumulator(object):
+    """
+    Per-class AP over predictions that arrive in batches.
+    With num_bins=None the (compact) scores are kept and compute() is exact,
+    i.e. the same as average_precision on the concatenated batches. With
+    num_bins set, only per-class histograms of positive and negative scores
+    over score_range are kept, so memory is O(C * num_bins) whatever the
+    number of examples; scores sharing a bin are treated as tied.
+    """
+
+    def __init__(self, num_classes=20, num_bins=None, score_range=(0., 1.),
+                 eps=1e-5):
+        self.num_classes = num_classes
+        self.num_bins = num_bins
+        self.score_range = score_range
+        self.eps = eps
+        self.reset()
+
+    def reset(self):
+        self._gt, self._scores, self._valid = [], [], []
+        if self.num_bins is not None:
+            self._pos = np.zeros((self.num_classes, self.num_bins))
+            self._neg = np.zeros((self.num_classes, self.num_bins))
+        self.count = 0
+
+    def update(self, gt, pred, valid=None):
+        """Add a batch; gt, pred (and valid) have shape BxC."""
+        gt = np.asarray(gt)
+        pred = np.asarray(pred)
+        if valid is None:
+            valid = np.ones(gt.shape, dtype=bool)
+        valid = np.asarray(valid) > 0
+        self.count += gt.shape[0]
+
+        if self.num_bins is None:
+            self._gt.append(gt.astype(np.int8))
+            self._scores.append(pred.astype(np.float32))
+            self._valid.append(valid)
+            return
+
+        lo, hi = self.score_range
+        bins = np.floor((pred - lo) / (hi - lo) * self.num_bins)
+        bins = np.clip(bins, 0, self.num_bins - 1).astype(np.int64)
+        bins += np.arange(self.num_classes) * self.num_bins
+        size = self.num_classes * self.num_bins
+        pos = valid & (gt > 0)
+        neg = valid & (gt <= 0)
+        self._pos += np.bincount(bins[pos], minlength=size).reshape(
+            self.num_classes, self.num_bins)
+        self._neg += np.bincount(bins[neg], minlength=size).reshape(
+            self.num_classes, self.num_bins)
+
+    def compute(self):
+        """Return the (C,) per-class APs; nan for classes without positives."""
+        if self.num_bins is None:
+            if not self._gt:
+                return np.full(self.num_classes, np.nan)
+            return average_precision(np.concatenate(self._gt),
+                                     np.concatenate(self._scores),
+                                     np.concatenate(self._valid),
+                                     eps=self.eps)
+
+        # Walk the bins from the highest score down; ties within a bin are
+        # broken pessimistically, like the eps in average_precision
+        pos = self._pos[:, ::-1]
+        tps = np.cumsum(pos, axis=1)
+        seen = np.cumsum(pos + self._neg[:, ::-1], axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(seen > 0, tps / seen, 0)
+            return np.sum(pos * precision, axis=1) / tps[:, -1]
+
+    def mean_ap(self):
+        """Mean AP over the classes that have positives."""
+        ap = self.compute()
+        return np.mean(ap[~np.isnan(ap)])
+
+
+def predict_map(predictions, gt, valid, batch_size=128, num_bins=None,
+                key='probabilities'):
+    """
+    Per-class AP of a stream of predictions, e.g. Estimator.predict().
+    predictions (iterable): One dict per example, in the order of gt rows.
+    gt, valid (np.ndarray): Shape NxC, as in compute_map.
+    Predictions are consumed batch_size at a time and never all held in
+    memory; see APAccumulator for num_bins.
+    """
+    acc = APAccumulator(num_classes=gt.shape[1], num_bins=num_bins)
+    batch = []
+    for p in predictions:
+        batch.append(p[key])
+        if len(batch) == batch_size:
+            start = acc.count
+            acc.update(gt[start:start + batch_size], np.stack(batch),
+                       valid[start:start + batch_size])
+            batch = []
+    if batch:
+        start = acc.count
+        acc.update(gt[start:start + len(batch)], np.stack(batch),
+                   valid[start:start + len(batch)])
+    assert acc.count == gt.shape[0], \
+        'Got {} predictions for {} examples'.format(acc.count, gt.shape[0])
+    return list(acc.compute())
+
+
+def _array_key(*arrays):
+    h = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(str((a.dtype.str, a.shape)).encode('utf-8'))
+        h.update(a.data)
+    return h.hexdigest()
+
+
+class EvalReport(object):
+    """
+    Prints the model mAP of an eval split next to its random and GT
+    baselines. The baselines only depend on gt/valid, so they are computed
+    once and cached (across instances) keyed on a hash of those arrays.
+    """
+    _baselines = {}
+
+    def __init__(self, gt, valid, class_names=None, seed=0):
+        self.gt = gt
+        self.valid = valid
+        self.class_names = class_names
+        self.key = _array_key(gt, valid)
+        if self.key not in EvalReport._baselines:
+            rng = np.random.RandomState(seed)
+            rand_AP = compute_map(gt, rng.random_sample(gt.shape), valid)
+            gt_AP = compute_map(gt, gt, valid)
+            EvalReport._baselines[self.key] = (rand_AP, gt_AP)
+        self.rand_AP, self.gt_AP = EvalReport._baselines[self.key]
+
+    def __call__(self, AP):
+        """Print the baselines, the obtained mAP and (optionally) per class."""
+        print('Random AP: {} mAP'.format(np.mean(self.rand_AP)))
+        print('GT AP: {} mAP'.format(np.mean(self.gt_AP)))
+        print('Obtained {} mAP'.format(np.mean(AP)))
+        if self.class_names is not None:
+            print('per class:')
+            for cname, ap in zip(self.class_names, AP):
+                print('{}: {}'.format(cname, ap))
+        return np.mean(AP)
@@ -1,53 +1,54 @@
 from math import sqrt
+import numpy as np
+
+def factorization(n):
+  '''Closest pair (grid_Y, grid_X) with grid_Y * grid_X == n, grid_Y <= grid_X.'''
+  for i in range(int(sqrt(float(n))), 0, -1):
+    if n % i == 0:
+      if i == 1: print('Who would enter a prime number of filters')
+      return (i, int(n / i))
 
 def put_kernels_on_grid (kernel, pad = 1):
 
   '''Visualize conv. filters as an image (mostly for the 1st layer).
   Arranges filters into a grid, with some paddings between adjacent filters.
+  Plain NumPy, so no graph or session is needed to render a checkpoint.
   Args:
-    kernel:            tensor of shape [Y, X, NumChannels, NumKernels]
+    kernel:            array of shape [Y, X, NumChannels, NumKernels]
     pad:               number of black pixels around each filter (between them)
   Return:
-    Tensor of shape [1, (Y+2*pad)*grid_Y, (X+2*pad)*grid_X, NumChannels].
+    float32 array of shape [1, (Y+2*pad)*grid_Y, (X+2*pad)*grid_X, NumChannels]
+    scaled to [0, 1]; filter n sits at grid cell (n % grid_Y, n // grid_Y).
   '''
+  kernel = np.asarray(kernel, dtype=np.float32)
+  Y, X, channels, num_kernels = kernel.shape
   # get shape of the grid. NumKernels == grid_Y * grid_X
-  def factorization(n):
-    for i in range(int(sqrt(float(n))), 0, -1):
-      if n % i == 0:
-        if i == 1: print('Who would enter a prime number of filters')
-        return (i, int(n / i))
-  (grid_Y, grid_X) = factorization (kernel.get_shape()[3].value)
-  print ('grid: %d = (%d, %d)' % (kernel.get_shape()[3].value, grid_Y, grid_X))
-
-  x_min = tf.reduce_min(kernel)
-  x_max = tf.reduce_max(kernel)
-  kernel = (kernel - x_min) / (x_max - x_min)
-
-  # pad X and Y
-  x = tf.pad(kernel, tf.constant( [[pad,pad],[pad, pad],[0,0],[0,0]] ), mode = 'CONSTANT')
-
-  # X and Y dimensions, w.r.t. padding
-  Y = kernel.get_shape()[0] + 2 * pad
-  X = kernel.get_shape()[1] + 2 * pad
+  (grid_Y, grid_X) = factorization (num_kernels)
 
-  channels = kernel.get_shape()[2]
+  x_min = kernel.min()
+  x_max = kernel.max()
+  kernel = (kernel - x_min) / max(x_max - x_min, 1e-12)
 
-  # put NumKernels to the 1st dimension
-  x = tf.transpose(x, (3, 0, 1, 2))
-  # organize grid on Y axis
-  x = tf.reshape(x, tf.stack([grid_X, Y * grid_Y, X, channels]))
-
-  # switch X and Y axes
-  x = tf.transpose(x, (0, 2, 1, 3))
-  # organize grid on X axis
-  x = tf.reshape(x, tf.stack([1, X * grid_X, Y * grid_Y, channels]))
+  # pad X and Y
+  x = np.pad(kernel, [[pad, pad], [pad, pad], [0, 0], [0, 0]], mode='constant')
+  Y += 2 * pad
+  X += 2 * pad
 
-  # back to normal order (not combining with the next step for clarity)
-  x = tf.transpose(x, (2, 1, 3, 0))
+  # [Y, X, C, grid_X * grid_Y] -> [grid_Y * Y, grid_X * X, C]
+  x = x.transpose(3, 0, 1, 2).reshape(grid_X, grid_Y, Y, X, channels)
+  x = x.transpose(1, 2, 0, 3, 4).reshape(grid_Y * Y, grid_X * X, channels)
 
-  # to tf.image_summary order [batch_size, height, width, channels],
-  #   where in this case batch_size == 1
-  x = tf.transpose(x, (3, 0, 1, 2))
+  # image summary order [batch_size, height, width, channels]
+  return x[np.newaxis]
 
-  # scaling to [0, 255] is not necessary for tensorboard
-  return x
+def kernel_image(kernel, pad = 1):
+  '''
+  put_kernels_on_grid as a uint8 [H, W, C] image, C being 1 or 3.
+  Kernels with other numbers of input channels (every layer past the first)
+  are shown one gray tile per filter, the L2 norm over input channels.
+  '''
+  kernel = np.asarray(kernel, dtype=np.float32)
+  if kernel.shape[2] not in (1, 3):
+    kernel = np.sqrt(np.sum(np.square(kernel), axis=2, keepdims=True))
+  grid = put_kernels_on_grid(kernel, pad = pad)[0]
+  return np.round(grid * 255).astype(np.uint8)
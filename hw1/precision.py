@@ -0,0 +1,51 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+# Static loss scale for float16 training; the gradients of a sigmoid cross
+# entropy on VGG are small enough to underflow float16 without it
+LOSS_SCALE = 128.
+
+
+def fp32_storage_getter(getter, name, shape=None, dtype=None,
+                        trainable=True, *args, **kwargs):
+    """
+    Custom getter that keeps trainable variables in float32 and hands the
+    layers a float16 cast of them, so updates are applied to float32
+    master weights. Variable names are unchanged.
+    """
+    storage_dtype = tf.float32 if trainable else dtype
+    variable = getter(name, shape, dtype=storage_dtype,
+                      trainable=trainable, *args, **kwargs)
+    if trainable and dtype != tf.float32:
+        variable = tf.cast(variable, dtype)
+    return variable
+
+
+def use_mixed_precision():
+    """
+    Make layers built from here on in the current graph store float32
+    weights behind float16 compute (see fp32_storage_getter). Layers take
+    their dtype from their input, so the input must be cast to float16.
+    """
+    tf.get_variable_scope().set_custom_getter(fp32_storage_getter)
+
+
+def compute_gradients(optimizer, loss, loss_scale=1.):
+    """optimizer.compute_gradients with static loss scaling."""
+    if loss_scale == 1.:
+        return optimizer.compute_gradients(loss)
+    grads_and_vars = optimizer.compute_gradients(loss * loss_scale)
+    return [(None if g is None else g / loss_scale, v)
+            for g, v in grads_and_vars]
+
+
+def session_config(jit=False):
+    """ConfigProto with XLA autoclustering turned on if jit."""
+    config = tf.ConfigProto()
+    if jit:
+        config.graph_options.optimizer_options.global_jit_level = \
+            tf.OptimizerOptions.ON_1
+    return config
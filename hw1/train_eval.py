@@ -0,0 +1,166 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+import numpy as np
+import tensorflow as tf
+
+from eval import APAccumulator
+
+
+class InProcessEvalHook(tf.train.SessionRunHook):
+    """
+    Evaluates mAP every N training steps without leaving the training session.
+    The prediction graph is built once, in its own graph and session. At
+    each evaluation the current weights are copied over from the training
+    session in memory, so there is no graph rebuild and no checkpoint
+    round trip per evaluation point.
+    Args:
+        model_fn: The Estimator model_fn, called once in PREDICT mode.
+        dataset_fn: Builds the one-pass eval tf.data.Dataset (see
+            data.make_eval_dataset_fn), in the same order as eval_labels.
+        eval_labels, eval_weights (np.ndarray): Nx20, as in compute_map.
+        every_n_steps (int): Evaluate when the global step is a multiple.
+        on_eval (callable): Called as on_eval(step, AP) after every
+            evaluation, AP being the per-class list from compute_map.
+        session_config (tf.ConfigProto): For the eval session.
+    """
+
+    def __init__(self, model_fn, dataset_fn, eval_labels, eval_weights,
+                 every_n_steps, on_eval=None, session_config=None):
+        self._model_fn = model_fn
+        self._dataset_fn = dataset_fn
+        self._eval_labels = eval_labels
+        self._eval_weights = eval_weights
+        self._every_n_steps = int(every_n_steps)
+        self._on_eval = on_eval
+        self._session_config = session_config
+        self.train_time = 0.
+        self.eval_time = 0.
+
+    def begin(self):
+        train_vars = dict((v.op.name, v) for v in tf.global_variables())
+
+        self._graph = tf.Graph()
+        with self._graph.as_default():
+            dataset = self._dataset_fn()
+            self._iterator = dataset.make_initializable_iterator()
+            features, _ = self._iterator.get_next()
+            spec = self._model_fn(features, None,
+                                  tf.estimator.ModeKeys.PREDICT)
+            self._probs = spec.predictions["probabilities"]
+
+            self._train_vars = []
+            self._feeds = []
+            assign_ops = []
+            for v in tf.global_variables():
+                if v.op.name not in train_vars:
+                    raise ValueError(
+                        'No training variable for {}'.format(v.op.name))
+                self._train_vars.append(train_vars[v.op.name])
+                value = tf.placeholder(v.dtype.base_dtype, v.get_shape())
+                self._feeds.append(value)
+                assign_ops.append(tf.assign(v, value))
+            self._assign_op = tf.group(*assign_ops)
+            init_op = tf.group(tf.global_variables_initializer(),
+                               tf.local_variables_initializer())
+        self._graph.finalize()
+        self._eval_sess = tf.Session(graph=self._graph,
+                                     config=self._session_config)
+        self._eval_sess.run(init_op)
+
+        self._global_step_tensor = tf.train.get_global_step()
+        self._last_step = None
+
+    def after_create_session(self, session, coord):
+        self._step = session.run(self._global_step_tensor)
+        self._start = time.time()
+
+    def after_run(self, run_context, run_values):
+        self._step += 1
+        if self._step % self._every_n_steps == 0:
+            self._evaluate(run_context.session)
+
+    def end(self, session):
+        if self._step != self._last_step:
+            self._evaluate(session)
+        self.train_time += time.time() - self._start
+        print('Time spent: {:.1f}s training, {:.1f}s evaluating'.format(
+            self.train_time, self.eval_time))
+        self._eval_sess.close()
+
+    def evaluate(self, session):
+        """Copy the weights out of session and return the per-class APs."""
+        values = session.run(self._train_vars)
+        self._eval_sess.run(self._assign_op,
+                            feed_dict=dict(zip(self._feeds, values)))
+        self._eval_sess.run(self._iterator.initializer)
+
+        acc = APAccumulator(num_classes=self._eval_labels.shape[1])
+        while True:
+            try:
+                probs = self._eval_sess.run(self._probs)
+            except tf.errors.OutOfRangeError:
+                break
+            end = acc.count + probs.shape[0]
+            acc.update(self._eval_labels[acc.count:end], probs,
+                       self._eval_weights[acc.count:end])
+        return list(acc.compute())
+
+    def _evaluate(self, session):
+        now = time.time()
+        self.train_time += now - self._start
+        AP = self.evaluate(session)
+        self._last_step = self._step
+        if self._on_eval is not None:
+            self._on_eval(self._step, AP)
+        self._start = time.time()
+        self.eval_time += self._start - now
+        print('step {}: mAP {:.4f} (train {:.1f}s, eval {:.1f}s so far)'.format(
+            self._step, np.mean(AP), self.train_time, self.eval_time))
+
+
+class ThroughputHook(tf.train.SessionRunHook):
+    """
+    Reports training images/sec. Only the time spent inside the training
+    session.run calls is counted, so evaluation and logging done by other
+    hooks (listed after this one) do not skew the number.
+    Args:
+        batch_size (int): Images per training step.
+        every_n_steps (int): Print the rate over the last N steps.
+        name (str): Printed with every report, e.g. the precision mode.
+    """
+
+    def __init__(self, batch_size, every_n_steps=100, name=''):
+        self._batch_size = batch_size
+        self._every_n_steps = int(every_n_steps)
+        self._name = name
+
+    def begin(self):
+        self._steps = 0
+        self._total_steps = 0
+        self._time = 0.
+        self._total_time = 0.
+
+    def before_run(self, run_context):
+        self._start = time.time()
+
+    def after_run(self, run_context, run_values):
+        elapsed = time.time() - self._start
+        self._steps += 1
+        self._time += elapsed
+        self._total_steps += 1
+        self._total_time += elapsed
+        if self._steps == self._every_n_steps:
+            print('{} {:.1f} images/sec'.format(
+                self._name, self._steps * self._batch_size / self._time))
+            self._steps = 0
+            self._time = 0.
+
+    def end(self, session):
+        if self._total_time > 0:
+            print('{} {:.1f} images/sec over {} steps'.format(
+                self._name,
+                self._total_steps * self._batch_size / self._total_time,
+                self._total_steps))
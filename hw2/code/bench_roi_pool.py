@@ -0,0 +1,174 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# Benchmark of the vectorized CPU RoI max pooling in
+# roi_pooling.functions.roi_pool_cpu, and parity check against loops ported
+# from ROIPoolForward/ROIPoolBackward (roi_pooling_kernel.cu): the forward
+# on some of the RoIs of the benchmark, and forward and backward on small
+# multi-image batches with ties, NaN and -inf.
+# Usage: python bench_roi_pool.py [NUM_ROIS [CHANNELS]]
+import _init_paths
+import math
+import sys
+import time
+import numpy as np
+
+from roi_pooling.functions.roi_pool_cpu import (roi_pool_forward,
+                                                roi_pool_backward)
+
+pooled_size = 6
+spatial_scale = 1. / 16
+data_height, data_width = 38, 63
+FLT_MAX = np.finfo(np.float32).max
+
+
+def _kernel_roi(roi, spatial_scale):
+    """Integer RoI and float32 bin sizes, as computed by the kernels."""
+    f32 = np.float32
+    start_w, start_h, end_w, end_h = [
+        int(math.copysign(math.floor(abs(v) + .5), v))
+        for v in (roi[1:5].astype(f32) * f32(spatial_scale))]
+    roi_width = max(end_w - start_w + 1, 1)
+    roi_height = max(end_h - start_h + 1, 1)
+    return (int(roi[0]), start_w, start_h, end_w, end_h,
+            f32(roi_height) / f32(pooled_size),
+            f32(roi_width) / f32(pooled_size))
+
+
+def roi_pool_forward_loop(features, rois):
+    """ROIPoolForward, vectorized over channels only."""
+    _, C, H, W = features.shape
+    shape = (len(rois), C, pooled_size, pooled_size)
+    output = np.zeros(shape, dtype=np.float32)
+    argmax = np.full(shape, -1, dtype=np.int32)
+    for i, roi in enumerate(rois):
+        n, start_w, start_h, _, _, bin_h, bin_w = \
+            _kernel_roi(roi, spatial_scale)
+        for ph in xrange(pooled_size):
+            hstart = min(max(int(math.floor(ph * bin_h)) + start_h, 0), H)
+            hend = min(max(int(math.ceil((ph + 1) * bin_h)) + start_h, 0), H)
+            for pw in xrange(pooled_size):
+                wstart = min(max(int(math.floor(pw * bin_w)) + start_w, 0), W)
+                wend = min(max(int(math.ceil((pw + 1) * bin_w)) + start_w, 0),
+                           W)
+                if hend <= hstart or wend <= wstart:
+                    continue
+                maxval = np.full(C, -FLT_MAX, dtype=np.float32)
+                maxidx = np.full(C, -1, dtype=np.int32)
+                for h in xrange(hstart, hend):
+                    for w in xrange(wstart, wend):
+                        val = features[n, :, h, w]
+                        # NaN compares false, so it is never taken
+                        take = val > maxval
+                        maxval[take] = val[take]
+                        maxidx[take] = (np.arange(C)[take] * H + h) * W + w
+                output[i, :, ph, pw] = maxval
+                argmax[i, :, ph, pw] = maxidx
+    return output, argmax
+
+
+def roi_pool_backward_loop(grad_output, rois, argmax, feature_shape):
+    """ROIPoolBackward, vectorized over channels only."""
+    N, C, H, W = feature_shape
+    grad = np.zeros(feature_shape, dtype=np.float32)
+    for n in xrange(N):
+        for h in xrange(H):
+            for w in xrange(W):
+                index = (np.arange(C) * H + h) * W + w
+                for i, roi in enumerate(rois):
+                    (roi_n, start_w, start_h, end_w, end_h,
+                     bin_h, bin_w) = _kernel_roi(roi, spatial_scale)
+                    if roi_n != n or not (start_w <= w <= end_w and
+                                          start_h <= h <= end_h):
+                        continue
+                    phstart = int(math.floor(np.float32(h - start_h) / bin_h))
+                    phend = int(math.ceil(np.float32(h - start_h + 1) / bin_h))
+                    pwstart = int(math.floor(np.float32(w - start_w) / bin_w))
+                    pwend = int(math.ceil(np.float32(w - start_w + 1) / bin_w))
+                    for ph in xrange(min(max(phstart, 0), pooled_size),
+                                     min(max(phend, 0), pooled_size)):
+                        for pw in xrange(min(max(pwstart, 0), pooled_size),
+                                         min(max(pwend, 0), pooled_size)):
+                            hit = argmax[i, :, ph, pw] == index
+                            grad[n, hit, h, w] += grad_output[i, hit, ph, pw]
+    return grad
+
+
+def make_rois(num_rois, rng, num_images=1, height=data_height,
+              width=data_width):
+    im_w, im_h = width * 16, height * 16
+    x1 = rng.uniform(0, im_w - 32, size=num_rois)
+    y1 = rng.uniform(0, im_h - 32, size=num_rois)
+    x2 = np.minimum(x1 + rng.uniform(32, im_w / 2, size=num_rois), im_w - 1)
+    y2 = np.minimum(y1 + rng.uniform(32, im_h / 2, size=num_rois), im_h - 1)
+    batch_inds = np.sort(rng.randint(num_images, size=num_rois))
+    return np.stack([batch_inds, x1, y1, x2, y2], axis=1).astype(np.float32)
+
+
+def check_parity(rng, trials=10):
+    """Exact forward and backward parity with the loops on small batches."""
+    for _ in xrange(trials):
+        num_images = rng.randint(1, 3)
+        shape = (num_images, 3, rng.randint(4, 12), rng.randint(4, 16))
+        # Few distinct values, for ties
+        features = rng.randint(-2, 3, size=shape).astype(np.float32)
+        features[rng.rand(*shape) < .05] = np.nan
+        features[rng.rand(*shape) < .05] = -np.inf
+        rois = make_rois(12, rng, num_images, shape[2], shape[3])
+        # Some RoIs past the map and some malformed
+        rois[:3, 1:] += rng.uniform(-64, 64, size=(3, 4))
+        output, argmax = roi_pool_forward(features, rois, pooled_size,
+                                          pooled_size, spatial_scale)
+        output_ref, argmax_ref = roi_pool_forward_loop(features, rois)
+        assert np.array_equal(output, output_ref)
+        assert np.array_equal(argmax, argmax_ref)
+        grad_output = rng.randn(*output.shape).astype(np.float32)
+        grad = roi_pool_backward(grad_output, rois, argmax, shape,
+                                 spatial_scale)
+        grad_ref = roi_pool_backward_loop(grad_output, rois, argmax, shape)
+        # The gradients of a position are summed in another order
+        assert np.allclose(grad, grad_ref, rtol=1e-5, atol=1e-5)
+
+
+def _time(fn, repeat=5):
+    best = float('inf')
+    for _ in xrange(repeat):
+        start = time.time()
+        out = fn()
+        best = min(best, time.time() - start)
+    return best, out
+
+
+def main():
+    num_rois = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    channels = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    rng = np.random.RandomState(0)
+    check_parity(rng)
+
+    features = rng.randn(1, channels, data_height, data_width) \
+        .astype(np.float32)
+    rois = make_rois(num_rois, rng)
+    shape = features.shape
+
+    t_fwd, (output, _) = _time(lambda: roi_pool_forward(
+        features, rois, pooled_size, pooled_size, spatial_scale,
+        with_argmax=False))
+    t_arg, (output_arg, argmax) = _time(lambda: roi_pool_forward(
+        features, rois, pooled_size, pooled_size, spatial_scale))
+    grad_output = rng.randn(*output.shape).astype(np.float32)
+    t_bwd, _ = _time(lambda: roi_pool_backward(
+        grad_output, rois, argmax, shape, spatial_scale))
+
+    output_ref, argmax_ref = roi_pool_forward_loop(features, rois[:50])
+    assert np.array_equal(output[:50], output_ref)
+    assert np.array_equal(argmax[:50], argmax_ref)
+    assert np.array_equal(output, output_arg)
+    print('{:d} RoIs x {:d} channels on {:d}x{:d}  forward {:.1f}ms  '
+          'forward+argmax {:.1f}ms  backward {:.1f}ms'.format(
+              num_rois, channels, data_height, data_width, 1e3 * t_fwd,
+              1e3 * t_arg, 1e3 * t_bwd))
+
+
+if __name__ == '__main__':
+    main()
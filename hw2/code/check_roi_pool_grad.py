@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# Check that RoIPool gives the same outputs and input gradients on the CPU
+# and on the GPU for a multi-image batch (RoIs of every image, in particular
+# batch index >= 1, must pass gradient to the conv features).
+# Run after rebuilding the extension (faster_rcnn/make.sh).
+# Usage: python check_roi_pool_grad.py [NUM_IMAGES]
+import _init_paths
+import sys
+import numpy as np
+import torch
+from torch.autograd import Variable
+
+from roi_pooling.modules.roi_pool import RoIPool
+
+num_channels = 16
+num_rois_per_image = 64
+data_height, data_width = 20, 30
+spatial_scale = 1. / 16
+
+
+def make_rois(num_images, rng):
+    rois = []
+    im_w, im_h = data_width * 16, data_height * 16
+    for n in xrange(num_images):
+        x1 = rng.uniform(0, im_w - 32, size=num_rois_per_image)
+        y1 = rng.uniform(0, im_h - 32, size=num_rois_per_image)
+        x2 = np.minimum(x1 + rng.uniform(16, im_w / 2,
+                                         size=num_rois_per_image), im_w - 1)
+        y2 = np.minimum(y1 + rng.uniform(16, im_h / 2,
+                                         size=num_rois_per_image), im_h - 1)
+        rois.append(np.stack([np.full(num_rois_per_image, n), x1, y1, x2, y2],
+                             axis=1))
+    return np.vstack(rois).astype(np.float32)
+
+
+def pool(features, rois, grad_output, cuda):
+    features = torch.from_numpy(features)
+    rois = torch.from_numpy(rois)
+    grad_output = torch.from_numpy(grad_output)
+    if cuda:
+        features, rois, grad_output = \
+            features.cuda(), rois.cuda(), grad_output.cuda()
+    features = Variable(features, requires_grad=True)
+    output = RoIPool(6, 6, spatial_scale)(features, Variable(rois))
+    output.backward(grad_output)
+    return output.data.cpu().numpy(), features.grad.data.cpu().numpy()
+
+
+def main():
+    assert torch.cuda.is_available(), 'the GPU check needs CUDA'
+    num_images = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    rng = np.random.RandomState(0)
+    features = rng.randn(num_images, num_channels, data_height,
+                         data_width).astype(np.float32)
+    rois = make_rois(num_images, rng)
+    grad_output = rng.randn(len(rois), num_channels, 6, 6).astype(np.float32)
+
+    output_cpu, grad_cpu = pool(features, rois, grad_output, cuda=False)
+    output_gpu, grad_gpu = pool(features, rois, grad_output, cuda=True)
+    assert np.array_equal(output_cpu, output_gpu), 'outputs differ'
+    for n in xrange(num_images):
+        assert np.abs(grad_cpu[n]).sum() > 0
+        # The GPU sums the gradients of a position in another order
+        assert np.allclose(grad_cpu[n], grad_gpu[n], rtol=1e-5, atol=1e-5), \
+            'gradients of image {:d} differ'.format(n)
+    print('{:d} images, {:d} RoIs: CPU and GPU outputs and gradients '
+          'match'.format(num_images, len(rois)))
+
+
+if __name__ == '__main__':
+    main()
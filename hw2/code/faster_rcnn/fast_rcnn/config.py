@@ -112,9 +112,13 @@ __C.TRAIN.SNAPSHOT_ITERS = 5000
 __C.TRAIN.SNAPSHOT_PREFIX = 'VGGnet_fast_rcnn'
 __C.TRAIN.SNAPSHOT_INFIX = ''
 
-# Use a prefetch thread in roi_data_layer.layer
-# So far I haven't found this useful; likely more engineering work is required
+# Build minibatches in background processes in roi_data_layer.layer
 __C.TRAIN.USE_PREFETCH = False
+# Number of prefetch processes
+__C.TRAIN.PREFETCH_WORKERS = 4
+# Number of minibatches prefetched ahead of the training loop (each one has a
+# preallocated shared-memory slot)
+__C.TRAIN.PREFETCH_QUEUE_SIZE = 8
 
 # Normalize the targets (subtract empirical mean, divide by empirical stddev)
 __C.TRAIN.BBOX_NORMALIZE_TARGETS = True
@@ -243,6 +247,14 @@ __C.MODELS_DIR = osp.abspath(osp.join(__C.ROOT_DIR, 'models', 'pascal_voc'))
 # Name (or path to) the matlab executable
 __C.MATLAB = 'matlab'
 
+# Budget (in MB) of the in-RAM tier of utils.image_cache, which keeps decoded
+# images resized to their blob scale. It is per process, except that the
+# TRAIN.PREFETCH_WORKERS prefetch processes split it between them
+__C.IMAGE_CACHE_MB = 2048
+
+# Directory for the on-disk tier of utils.image_cache; empty to disable
+__C.IMAGE_CACHE_DIR = ''
+
 # Place outputs under an experiments directory
 __C.EXP_DIR = 'default'
 __C.LOG_DIR = 'default'
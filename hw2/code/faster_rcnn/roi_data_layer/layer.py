@@ -10,33 +10,93 @@
 RoIDataLayer implements a Caffe Python layer.
 """
 
+import atexit
+import traceback
+from multiprocessing import Process, Queue, RawArray
+
+import cv2
 import numpy as np
 
 # >>>> obsolete, because it depends on sth outside of this project
 from fast_rcnn.config import cfg
 # <<<< obsolete
 from roi_data_layer.minibatch import get_weak_minibatch
+from utils.image_cache import get_image_cache
 
 class RoIDataLayer(object):
     """Fast R-CNN data layer used for training."""
 
-    def __init__(self, roidb, num_classes):
-        """Set the roidb to be used by this layer during training."""
+    def __init__(self, roidb, num_classes, seed=None):
+        """Set the roidb to be used by this layer during training.
+
+        The image order and the per-minibatch random draws (scales) all come
+        from seed, so the blobs do not depend on cfg.TRAIN.USE_PREFETCH or on
+        the number of prefetch workers. If seed is None it is drawn from
+        np.random.
+        """
         self._roidb = roidb
         self._num_classes = num_classes
+        if seed is None:
+            seed = np.random.randint(2 ** 31 - 1)
+        self._rng = np.random.RandomState(seed)
+        if cfg.TRAIN.ASPECT_GROUPING:
+            self._aspect_groups = self._get_aspect_groups()
         self._shuffle_roidb_inds()
+        if cfg.TRAIN.USE_PREFETCH:
+            self._start_prefetch()
+
+    def _get_aspect_groups(self):
+        """Return the roidb indices of the landscape and of the portrait
+        images (leaving out images without boxes when not using an RPN,
+        since _get_next_minibatch_inds would skip them)."""
+        widths = np.array([r['width'] for r in self._roidb])
+        heights = np.array([r['height'] for r in self._roidb])
+        usable = np.ones(len(self._roidb), dtype=bool)
+        if not cfg.TRAIN.HAS_RPN:
+            usable = np.array([r['boxes'].shape[0] != 0 for r in self._roidb])
+        horz = widths >= heights
+        return [np.where(usable & horz)[0],
+                np.where(usable & np.logical_not(horz))[0]]
 
     def _shuffle_roidb_inds(self):
-        """Randomly permute the training roidb."""
-        self._perm = np.random.permutation(np.arange(len(self._roidb)))
+        """Randomly permute the training roidb.
+
+        With cfg.TRAIN.ASPECT_GROUPING, every IMS_PER_BATCH consecutive
+        indices come from the same aspect group, so the images of a
+        minibatch need little zero-padding in im_list_to_blob. The images
+        left over in the groups are put together in a mixed minibatch, and
+        those that still do not fill one are dropped from this pass through
+        the roidb. With too few images for a single minibatch, the roidb is
+        permuted as without grouping.
+        """
+        if cfg.TRAIN.ASPECT_GROUPING:
+            ims_per_batch = cfg.TRAIN.IMS_PER_BATCH
+            batches = []
+            leftovers = []
+            for group in self._aspect_groups:
+                inds = self._rng.permutation(group)
+                num_batches = len(inds) // ims_per_batch
+                batches.append(np.reshape(inds[:num_batches * ims_per_batch],
+                                          (-1, ims_per_batch)))
+                leftovers.append(inds[num_batches * ims_per_batch:])
+            leftovers = np.concatenate(leftovers)
+            num_mixed = len(leftovers) // ims_per_batch
+            batches.append(np.reshape(leftovers[:num_mixed * ims_per_batch],
+                                      (-1, ims_per_batch)))
+            batches = np.vstack(batches)
+        if cfg.TRAIN.ASPECT_GROUPING and batches.shape[0] > 0:
+            row_perm = self._rng.permutation(np.arange(batches.shape[0]))
+            self._perm = np.reshape(batches[row_perm, :], (-1,))
+        else:
+            self._perm = self._rng.permutation(np.arange(len(self._roidb)))
         # self._perm = np.arange(len(self._roidb))
         self._cur = 0
 
     def _get_next_minibatch_inds(self):
         """Return the roidb indices for the next minibatch."""
-        
+
         if cfg.TRAIN.HAS_RPN:
-            if self._cur + cfg.TRAIN.IMS_PER_BATCH >= len(self._roidb):
+            if self._cur + cfg.TRAIN.IMS_PER_BATCH >= len(self._perm):
                 self._shuffle_roidb_inds()
 
             db_inds = self._perm[self._cur:self._cur + cfg.TRAIN.IMS_PER_BATCH]
@@ -53,22 +113,176 @@ class RoIDataLayer(object):
                     i += 1
 
                 self._cur += 1
-                if self._cur >= len(self._roidb):
+                if self._cur >= len(self._perm):
                     self._shuffle_roidb_inds()
 
         return db_inds
 
+    def _get_next_minibatch_task(self):
+        """Return the roidb indices and the random seed of the next
+        minibatch."""
+        db_inds = self._get_next_minibatch_inds()
+        return db_inds, self._rng.randint(2 ** 31 - 1)
+
     def _get_next_minibatch(self):
         """Return the blobs to be used for the next minibatch.
 
-        If cfg.TRAIN.USE_PREFETCH is True, then blobs will be computed in a
-        separate process and made available through self._blob_queue.
+        If cfg.TRAIN.USE_PREFETCH is True, then blobs will be computed in
+        separate processes and made available through self._blob_queue.
         """
-        db_inds = self._get_next_minibatch_inds()
+        if cfg.TRAIN.USE_PREFETCH:
+            return self._get_prefetched_minibatch()
+        db_inds, seed = self._get_next_minibatch_task()
         minibatch_db = [self._roidb[i] for i in db_inds]
-        return get_weak_minibatch(minibatch_db, self._num_classes)
-            
+        return _build_minibatch(minibatch_db, self._num_classes, seed)
+
+    def _start_prefetch(self):
+        """Start the BlobFetcher processes and queue the first minibatches.
+
+        Call this before CUDA is initialized: the workers are forked.
+        """
+        num_slots = max(cfg.TRAIN.PREFETCH_QUEUE_SIZE, 1)
+        slot_bytes = _slot_bytes()
+        slots = [RawArray('B', slot_bytes) for _ in xrange(num_slots)]
+        self._slots = [np.frombuffer(slot, dtype=np.uint8) for slot in slots]
+        self._task_queue = Queue()
+        self._blob_queue = Queue()
+        # Minibatches that arrived out of order, by batch id
+        self._ready = {}
+        self._num_queued = 0
+        self._next_batch = 0
+        num_workers = max(cfg.TRAIN.PREFETCH_WORKERS, 1)
+        self._prefetch_processes = [
+            BlobFetcher(self._task_queue, self._blob_queue, slots,
+                        self._roidb, self._num_classes, num_workers)
+            for _ in xrange(num_workers)]
+        for p in self._prefetch_processes:
+            p.start()
+
+        # Terminate the child processes when the parent exits
+        def cleanup():
+            print 'Terminating BlobFetcher'
+            for p in self._prefetch_processes:
+                p.terminate()
+                p.join()
+        atexit.register(cleanup)
+
+        for slot in xrange(num_slots):
+            self._queue_minibatch(slot)
+
+    def _queue_minibatch(self, slot):
+        """Ask the workers for the next minibatch, to be written to slot."""
+        db_inds, seed = self._get_next_minibatch_task()
+        self._task_queue.put((self._num_queued, slot, db_inds, seed))
+        self._num_queued += 1
+
+    def _get_prefetched_minibatch(self):
+        """Return the next prefetched minibatch, in the order it was queued.
+
+        The blobs are copied out of their shared-memory slot, which is then
+        reused for the next minibatch.
+        """
+        while self._next_batch not in self._ready:
+            batch_id, slot, packed = self._blob_queue.get()
+            if isinstance(packed, str):
+                raise RuntimeError('BlobFetcher failed:\n' + packed)
+            self._ready[batch_id] = (slot, packed)
+        slot, packed = self._ready.pop(self._next_batch)
+        self._next_batch += 1
+        blobs = _unpack_blobs(packed, self._slots[slot])
+        self._queue_minibatch(slot)
+        return blobs
+
     def forward(self):
         """Get blobs and copy them into this layer's top blob vector."""
         blobs = self._get_next_minibatch()
         return blobs
+
+class BlobFetcher(Process):
+    """Builds the minibatches queued by RoIDataLayer in a separate process.
+
+    Tasks are (batch id, slot, roidb indices, seed). The arrays of each
+    minibatch are written into the given shared-memory slot, and only their
+    offsets and shapes (plus the small non-array blobs) go back through
+    result_queue. The num_workers workers split cfg.IMAGE_CACHE_MB.
+    """
+    def __init__(self, task_queue, result_queue, slots, roidb, num_classes,
+                 num_workers=1):
+        super(BlobFetcher, self).__init__()
+        self._task_queue = task_queue
+        self._result_queue = result_queue
+        self._slots = slots
+        self._roidb = roidb
+        self._num_classes = num_classes
+        self._num_workers = num_workers
+        self.daemon = True
+
+    def run(self):
+        # The workers already run in parallel; keep cv2 from oversubscribing
+        cv2.setNumThreads(1)
+        get_image_cache().max_bytes = \
+            (int(cfg.IMAGE_CACHE_MB) << 20) // self._num_workers
+        slots = [np.frombuffer(slot, dtype=np.uint8) for slot in self._slots]
+        while True:
+            batch_id, slot, db_inds, seed = self._task_queue.get()
+            try:
+                minibatch_db = [self._roidb[i] for i in db_inds]
+                blobs = _build_minibatch(minibatch_db, self._num_classes, seed)
+                packed = _pack_blobs(blobs, slots[slot])
+            except Exception:
+                packed = traceback.format_exc()
+            self._result_queue.put((batch_id, slot, packed))
+
+def _build_minibatch(roidb, num_classes, seed):
+    """get_weak_minibatch with np.random seeded by seed.
+
+    The global random state is restored afterwards, so the blobs only depend
+    on seed and not on which process builds them.
+    """
+    state = np.random.get_state()
+    np.random.seed(seed)
+    try:
+        return get_weak_minibatch(roidb, num_classes)
+    finally:
+        np.random.set_state(state)
+
+def _slot_bytes():
+    """Size of a shared-memory slot: a full-size float32 image blob plus
+    room for the RoIs."""
+    num_images = cfg.TRAIN.IMS_PER_BATCH
+    data_bytes = num_images * cfg.TRAIN.MAX_SIZE ** 2 * 3 * 4
+    return data_bytes + num_images * (1 << 20)
+
+def _pack_blobs(blobs, buf):
+    """Copy the arrays in blobs into the uint8 buffer buf.
+
+    Returns a picklable description of blobs: (offset, shape, dtype) for the
+    arrays written to buf, and the value itself for everything else
+    (including arrays that do not fit).
+    """
+    packed = {}
+    offset = 0
+    for key, value in blobs.iteritems():
+        if isinstance(value, np.ndarray) and \
+                offset + value.nbytes <= buf.size:
+            value = np.ascontiguousarray(value)
+            buf[offset:offset + value.nbytes].view(value.dtype)[:] = \
+                value.ravel()
+            packed[key] = ('shared', (offset, value.shape, value.dtype.str))
+            # Keep every array 64-byte aligned
+            offset += (value.nbytes + 63) // 64 * 64
+        else:
+            packed[key] = ('value', value)
+    return packed
+
+def _unpack_blobs(packed, buf):
+    """Blobs described by _pack_blobs, with the arrays copied out of buf."""
+    blobs = {}
+    for key, (kind, value) in packed.iteritems():
+        if kind == 'shared':
+            offset, shape, dtype = value
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            value = buf[offset:offset + nbytes].view(dtype).reshape(shape) \
+                .copy()
+        blobs[key] = value
+    return blobs
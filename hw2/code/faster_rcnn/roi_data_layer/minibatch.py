@@ -20,6 +20,7 @@ import torchvision.transforms as transforms
 from fast_rcnn.config import cfg
 # <<<< obsolete
 from utils.blob import prep_im_for_blob, im_list_to_blob
+from utils.image_cache import get_image_cache
 
 
 def get_weak_minibatch(roidb, num_classes):
@@ -42,34 +43,17 @@ def get_weak_minibatch(roidb, num_classes):
     blobs = {'data': im_blob}
     
     # Now, build the region of interest and label blobs
-    rois_blob = np.zeros((0, 5), dtype=np.float32)
-    boxscores_blob = np.zeros(0, dtype=np.float32)
-    labels_blob = np.zeros((num_images,num_classes), dtype=np.float32)
-    bbox_targets_blob = np.zeros((0, 4 * num_classes), dtype=np.float32)
-    bbox_inside_blob = np.zeros(bbox_targets_blob.shape, dtype=np.float32)
-    thislabels = np.zeros((1,num_classes))
-    det_prior_blob = np.zeros((0, num_classes), dtype=np.float32)
-    # all_overlaps = []
-
-
+    im_rois = []
     for im_i in xrange(num_images):
-        labels, overlaps, im_rois, bbox_targets, bbox_inside_weights \
+        labels, overlaps, rois, bbox_targets, bbox_inside_weights \
             = _sample_rois(roidb[im_i], fg_rois_per_image, rois_per_image,
                            num_classes)
-            
-        #TODO: same as get_minibatch, but we only use the image-level labels
-        #So blobs['labels'] should contain a 1x20 binary vector for each image 
-        gt_classes = roidb[im_i]['gt_classes']
-        for cls_idx in xrange(len(gt_classes)):
-            if gt_classes[cls_idx] > 0:
-                labels_blob[im_i][gt_classes[cls_idx]-1] = 1
-        # Add to RoIs blob
-        rois = _project_im_rois(im_rois, im_scales[im_i])
-        batch_ind = im_i * np.ones((rois.shape[0], 1))
-        rois_blob_this_image = np.hstack((batch_ind, rois))
-        rois_blob = np.vstack((rois_blob, rois_blob_this_image))
-
-           
+        im_rois.append(rois)
+    rois_blob = _get_rois_blob(im_rois, im_scales)
+
+    # Only the image-level labels are used: a 1x20 binary vector per image
+    labels_blob = _get_image_labels_blob(roidb, num_classes)
+
     blobs['rois'] = rois_blob
     blobs['labels'] = labels_blob
     blobs['im_name'] = os.path.basename(roidb[0]['image'])
@@ -117,28 +101,26 @@ def get_minibatch(roidb, num_classes):
 
     else: # not using RPN
         # Now, build the region of interest and label blobs
-        rois_blob = np.zeros((0, 5), dtype=np.float32)
-        labels_blob = np.zeros((0), dtype=np.float32)
-        bbox_targets_blob = np.zeros((0, 4 * num_classes), dtype=np.float32)
-        bbox_inside_blob = np.zeros(bbox_targets_blob.shape, dtype=np.float32)
+        im_rois, im_labels, im_bbox_targets, im_bbox_inside = [], [], [], []
         # all_overlaps = []
         for im_i in xrange(num_images):
-            labels, overlaps, im_rois, bbox_targets, bbox_inside_weights \
+            labels, overlaps, rois, bbox_targets, bbox_inside_weights \
                 = _sample_rois(roidb[im_i], fg_rois_per_image, rois_per_image,
                                num_classes)
-
-            # Add to RoIs blob
-            rois = _project_im_rois(im_rois, im_scales[im_i])
-            batch_ind = im_i * np.ones((rois.shape[0], 1))
-            rois_blob_this_image = np.hstack((batch_ind, rois))
-            rois_blob = np.vstack((rois_blob, rois_blob_this_image))
-
-            # Add to labels, bbox targets, and bbox loss blobs
-            labels_blob = np.hstack((labels_blob, labels))
-            bbox_targets_blob = np.vstack((bbox_targets_blob, bbox_targets))
-            bbox_inside_blob = np.vstack((bbox_inside_blob, bbox_inside_weights))
+            im_rois.append(rois)
+            im_labels.append(labels)
+            im_bbox_targets.append(bbox_targets)
+            im_bbox_inside.append(bbox_inside_weights)
             # all_overlaps = np.hstack((all_overlaps, overlaps))
 
+        # Each blob is allocated once at its final size
+        rois_blob = _get_rois_blob(im_rois, im_scales)
+        labels_blob = np.concatenate(im_labels).astype(np.float32, copy=False)
+        bbox_targets_blob = np.concatenate(im_bbox_targets) \
+            .astype(np.float32, copy=False)
+        bbox_inside_blob = np.concatenate(im_bbox_inside) \
+            .astype(np.float32, copy=False)
+
         # For debug visualizations
         # _vis_minibatch(im_blob, rois_blob, labels_blob, all_overlaps)
 
@@ -185,19 +167,15 @@ def _get_image_blob(roidb, scale_inds):
     im_scales = []
     mean=np.array([[[0.485, 0.456, 0.406]]])
     std=np.array([[[0.229, 0.224, 0.225]]])
+    image_cache = get_image_cache()
     for i in xrange(num_images):
-        #from IPython.core.debugger import Tracer; Tracer()()
-
-        im = cv2.imread(roidb[i]['image'])/255.0
-        if roidb[i]['flipped']:
-            im = im[:, ::-1, :]
         target_size = cfg.TRAIN.SCALES[scale_inds[i]]
-        #im, im_scale = prep_im_for_blob(im, cfg.PIXEL_MEANS, target_size,
-        #                                cfg.TRAIN.MAX_SIZE)
-        im, im_scale = prep_im_for_blob(im, target_size,
-                                        cfg.TRAIN.MAX_SIZE,
-                                       mean=mean,
-                                       std=std)
+        im, im_scale = image_cache.get_normalized(roidb[i]['image'],
+                                                  target_size,
+                                                  cfg.TRAIN.MAX_SIZE,
+                                                  flipped=roidb[i]['flipped'],
+                                                  mean=mean,
+                                                  std=std)
         im_scales.append(im_scale)
         processed_ims.append(im)
 
@@ -206,6 +184,34 @@ def _get_image_blob(roidb, scale_inds):
 
     return blob, im_scales
 
+def _get_rois_blob(im_rois, im_scales):
+    """Build the R x 5 float32 RoI blob of (batch index, x1, y1, x2, y2)
+    from the RoIs of every image, projected into the rescaled images.
+
+    The blob is allocated once and filled image by image.
+    """
+    num_rois = [rois.shape[0] for rois in im_rois]
+    rois_blob = np.empty((sum(num_rois), 5), dtype=np.float32)
+    start = 0
+    for im_i, rois in enumerate(im_rois):
+        end = start + num_rois[im_i]
+        rois_blob[start:end, 0] = im_i
+        np.multiply(rois, im_scales[im_i], out=rois_blob[start:end, 1:])
+        start = end
+    return rois_blob
+
+def _get_image_labels_blob(roidb, num_classes):
+    """Build the num_images x num_classes binary blob of the (non-background)
+    classes present in each image."""
+    gt_classes = [r['gt_classes'] for r in roidb]
+    im_inds = np.repeat(np.arange(len(roidb)),
+                        [len(classes) for classes in gt_classes])
+    gt_classes = np.concatenate(gt_classes)
+    fg = gt_classes > 0
+    labels_blob = np.zeros((len(roidb), num_classes), dtype=np.float32)
+    labels_blob[im_inds[fg], gt_classes[fg] - 1] = 1
+    return labels_blob
+
 def _project_im_rois(im_rois, im_scale_factor):
     """Project image RoIs into the rescaled training image."""
     rois = im_rois * im_scale_factor
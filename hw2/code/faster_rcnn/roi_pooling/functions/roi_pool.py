@@ -1,6 +1,11 @@
 import torch
 from torch.autograd import Function
-from .._ext import roi_pooling
+try:
+    from .._ext import roi_pooling
+except ImportError:
+    # Only the CUDA path needs the compiled extension
+    roi_pooling = None
+from .roi_pool_cpu import roi_pool_forward, roi_pool_backward
 
 
 class RoIPoolFunction(Function):
@@ -16,31 +21,38 @@ class RoIPoolFunction(Function):
     def forward(self, features, rois):
         batch_size, num_channels, data_height, data_width = features.size()
         num_rois = rois.size()[0]
-        output = torch.zeros(num_rois, num_channels, self.pooled_height, self.pooled_width)
-        argmax = torch.IntTensor(num_rois, num_channels, self.pooled_height, self.pooled_width).zero_()
 
         if not features.is_cuda:
-            _features = features.permute(0, 2, 3, 1)
-            roi_pooling.roi_pooling_forward(self.pooled_height, self.pooled_width, self.spatial_scale,
-                                            _features, rois, output)
-            # output = output.cuda()
+            # The argmax is only needed for the backward pass
+            with_argmax = getattr(self, 'needs_input_grad', (True,))[0]
+            _output, _argmax = roi_pool_forward(
+                features.numpy(), rois.numpy(), self.pooled_height,
+                self.pooled_width, self.spatial_scale, with_argmax=with_argmax)
+            output = torch.from_numpy(_output)
+            argmax = torch.from_numpy(_argmax) if with_argmax else None
         else:
-            output = output.cuda()
-            argmax = argmax.cuda()
+            output = torch.zeros(num_rois, num_channels, self.pooled_height, self.pooled_width).cuda()
+            argmax = torch.IntTensor(num_rois, num_channels, self.pooled_height, self.pooled_width).zero_().cuda()
             roi_pooling.roi_pooling_forward_cuda(self.pooled_height, self.pooled_width, self.spatial_scale,
                                                  features, rois, output, argmax)
-            self.output = output
-            self.argmax = argmax
-            self.rois = rois
-            self.feature_size = features.size()
+        self.output = output
+        self.argmax = argmax
+        self.rois = rois
+        self.feature_size = features.size()
 
         return output
 
     def backward(self, grad_output):
-        assert(self.feature_size is not None and grad_output.is_cuda)
+        assert(self.feature_size is not None and self.argmax is not None)
 
         batch_size, num_channels, data_height, data_width = self.feature_size
 
+        if not grad_output.is_cuda:
+            grad_input = torch.from_numpy(roi_pool_backward(
+                grad_output.contiguous().numpy(), self.rois.numpy(),
+                self.argmax.numpy(), self.feature_size, self.spatial_scale))
+            return grad_input, None
+
         grad_input = torch.zeros(batch_size, num_channels, data_height, data_width).cuda()
         roi_pooling.roi_pooling_backward_cuda(self.pooled_height, self.pooled_width, self.spatial_scale,
                                               grad_output, self.rois, grad_input, self.argmax)
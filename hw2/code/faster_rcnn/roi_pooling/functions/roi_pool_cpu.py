@@ -0,0 +1,259 @@
+"""Vectorized CPU RoI max pooling with the semantics of the CUDA kernel.
+
+The bins of every RoI are computed exactly as ROIPoolForward does (float32
+bin sizes, C round() of the scaled coordinates, clipping to the feature
+map). The max over each bin is answered from a 2D sparse table of the
+feature map: for every pair of power-of-two window sizes (2^kh, 2^kw) the
+table holds the max of the window starting at each (h, w), so any bin is
+the max of four overlapping windows.
+
+For the argmax, the table holds int64 keys that order like (value, -position)
+instead of the values, so the max key gives both the max and the first
+maximum in (h, w) scan order (the smallest position among the maxima), as
+in the kernel. The backward pass then routes gradients to the same inputs.
+"""
+
+import numpy as np
+
+FLT_MAX = np.finfo(np.float32).max
+
+# (RoI, bin) rows per block of sparse-table lookups
+ROWS_PER_BLOCK = 256
+
+_LOW_BITS = 0xFFFFFFFF
+_SIGN_FLIP = np.int32(0x7FFFFFFF)
+
+
+def _c_round(x):
+    """C round(): halfway cases away from zero (np.round rounds to even)."""
+    x = x.astype(np.float64)
+    return (np.sign(x) * np.floor(np.abs(x) + 0.5)).astype(np.int64)
+
+
+def _roi_geometry(rois, spatial_scale):
+    """Rounded (start_w, start_h, end_w, end_h) of each RoI on the feature
+    map and its width and height (at least 1)."""
+    coords = rois[:, 1:5].astype(np.float32) * np.float32(spatial_scale)
+    start_w, start_h, end_w, end_h = _c_round(coords).T
+    # Force malformed ROIs to be 1x1
+    roi_width = np.maximum(end_w - start_w + 1, 1)
+    roi_height = np.maximum(end_h - start_h + 1, 1)
+    return start_w, start_h, end_w, end_h, roi_width, roi_height
+
+
+def _bin_bounds(start, roi_size, pooled_size, data_size):
+    """(R, pooled_size) clipped [start, end) of every bin along one axis."""
+    bin_size = roi_size.astype(np.float32) / np.float32(pooled_size)
+    p = np.arange(pooled_size, dtype=np.float32)
+    lo = np.floor(p[np.newaxis, :] * bin_size[:, np.newaxis]).astype(np.int64)
+    hi = np.ceil((p[np.newaxis, :] + 1) * bin_size[:, np.newaxis]) \
+        .astype(np.int64)
+    lo = np.clip(lo + start[:, np.newaxis], 0, data_size)
+    hi = np.clip(hi + start[:, np.newaxis], 0, data_size)
+    return lo, hi
+
+
+def _log2_floor(n):
+    return np.floor(np.log2(np.maximum(n, 1))).astype(np.int64)
+
+
+def _sparse_table(x):
+    """2D sparse table of x (N, H, W, C), as (LH * LW * N * H * W + 1, C)
+    rows of x's dtype.
+
+    Row ((kh * LW + kw) * N + n) * H * W + h * W + w holds the max of
+    x[n, h:h + 2^kh, w:w + 2^kw] (only defined where the window fits). The
+    last row is 0, which is what an empty bin reads.
+    """
+    N, H, W, C = x.shape
+    LH, LW = int(_log2_floor(H)) + 1, int(_log2_floor(W)) + 1
+    rows = np.empty((LH * LW * N * H * W + 1, C), dtype=x.dtype)
+    rows[-1] = 0
+    table = rows[:-1].reshape(LH, LW, N, H, W, C)
+    table[0, 0] = x
+    for kh in range(1, LH):
+        s, n = 1 << (kh - 1), H - (1 << kh) + 1
+        np.maximum(table[kh - 1, 0, :, :n], table[kh - 1, 0, :, s:s + n],
+                   out=table[kh, 0, :, :n])
+    for kh in range(LH):
+        m = H - (1 << kh) + 1
+        for kw in range(1, LW):
+            s, n = 1 << (kw - 1), W - (1 << kw) + 1
+            np.maximum(table[kh, kw - 1, :, :m, :n],
+                       table[kh, kw - 1, :, :m, s:s + n],
+                       out=table[kh, kw, :, :m, :n])
+    return rows
+
+
+def _encode(x):
+    """int64 keys of x (N, H, W, C) that order by value, then by smaller
+    position (c * H + h) * W + w."""
+    N, H, W, C = x.shape
+    # -0.0 would otherwise order below 0.0
+    bits = (x + np.float32(0)).view(np.int32)
+    ordered = np.where(bits < 0, bits ^ _SIGN_FLIP, bits).astype(np.int64)
+    pos = np.arange(H * W, dtype=np.int64).reshape(1, H, W, 1) + \
+        np.arange(C, dtype=np.int64) * (H * W)
+    return (ordered << 32) | (_LOW_BITS - pos)
+
+
+def _decode(keys, values, argmax, buf):
+    """Write the values and positions of keys into values and argmax. The
+    all-zero key of an empty bin decodes to (0, -1)."""
+    high = np.right_shift(keys, 32, out=buf)
+    ordered = high.astype(np.int32)
+    np.bitwise_xor(ordered, _SIGN_FLIP, out=ordered, where=ordered < 0)
+    values[...] = ordered.view(np.float32)
+    low = np.bitwise_and(keys, _LOW_BITS, out=buf)
+    # 2^32 - 1 wraps to -1 in int32
+    argmax[...] = np.subtract(_LOW_BITS, low, out=buf)
+
+
+def roi_pool_forward(features, rois, pooled_height, pooled_width,
+                     spatial_scale, with_argmax=True):
+    """RoI max pooling of features (N, C, H, W) float32 over rois (R, 5) of
+    (batch index, x1, y1, x2, y2).
+
+    Returns the (R, C, pooled_height, pooled_width) float32 output and, if
+    with_argmax, the int32 position (c * H + h) * W + w in the RoI's image of
+    each maximum (-1 where nothing was pooled), as ROIPoolForward.
+    """
+    features = np.asarray(features, dtype=np.float32)
+    rois = np.asarray(rois)
+    N, C, H, W = features.shape
+    R = rois.shape[0]
+    PH, PW = pooled_height, pooled_width
+
+    batch_inds = rois[:, 0].astype(np.int64)
+    start_w, start_h, _, _, roi_width, roi_height = \
+        _roi_geometry(rois, spatial_scale)
+    hstart, hend = _bin_bounds(start_h, roi_height, PH, H)
+    wstart, wend = _bin_bounds(start_w, roi_width, PW, W)
+
+    x = np.ascontiguousarray(features.transpose(0, 2, 3, 1))
+    if np.isnan(x).any():
+        # The kernel never selects a NaN
+        x[np.isnan(x)] = -np.inf
+    table = _sparse_table(_encode(x) if with_argmax else x)
+    LW = int(_log2_floor(W)) + 1
+
+    # (R, PH, PW) bin bounds, window levels and the four window corners
+    hs = np.broadcast_to(hstart[:, :, np.newaxis], (R, PH, PW))
+    he = np.broadcast_to(hend[:, :, np.newaxis], (R, PH, PW))
+    ws = np.broadcast_to(wstart[:, np.newaxis, :], (R, PH, PW))
+    we = np.broadcast_to(wend[:, np.newaxis, :], (R, PH, PW))
+    kh = _log2_floor(he - hs)
+    kw = _log2_floor(we - ws)
+    base = ((kh * LW + kw) * N + batch_inds[:, np.newaxis, np.newaxis]) * H
+    h_top, h_bottom = hs, np.maximum(he - (1 << kh), 0)
+    w_left, w_right = ws, np.maximum(we - (1 << kw), 0)
+    corners = np.stack([(base + h_top) * W + w_left,
+                        (base + h_top) * W + w_right,
+                        (base + h_bottom) * W + w_left,
+                        (base + h_bottom) * W + w_right])
+    corners[:, (he <= hs) | (we <= ws)] = len(table) - 1
+    corners = corners.reshape(4, R * PH * PW)
+
+    # One row of C channels per (RoI, bin), computed block by block so the
+    # temporaries stay in cache
+    num_rows = R * PH * PW
+    output = np.empty((num_rows, C), dtype=np.float32)
+    argmax = np.empty((num_rows, C), dtype=np.int32) if with_argmax else None
+    best = np.empty((ROWS_PER_BLOCK, C), dtype=table.dtype)
+    buf = np.empty((ROWS_PER_BLOCK, C), dtype=table.dtype)
+    for r0 in range(0, num_rows, ROWS_PER_BLOCK):
+        r1 = min(r0 + ROWS_PER_BLOCK, num_rows)
+        n = r1 - r0
+        b = output[r0:r1] if not with_argmax else best[:n]
+        np.take(table, corners[0, r0:r1], axis=0, out=b, mode='clip')
+        for k in range(1, 4):
+            np.take(table, corners[k, r0:r1], axis=0, out=buf[:n],
+                    mode='clip')
+            np.maximum(b, buf[:n], out=b)
+        if with_argmax:
+            _decode(b, output[r0:r1], argmax[r0:r1], buf[:n])
+
+    if (x <= -FLT_MAX).any():
+        # The kernel starts from -FLT_MAX and only takes strictly larger
+        # values
+        unset = output <= -FLT_MAX
+        output[unset] = -FLT_MAX
+        if with_argmax:
+            argmax[unset] = -1
+    output = output.reshape(R, PH, PW, C).transpose(0, 3, 1, 2)
+    if not with_argmax:
+        return np.ascontiguousarray(output), None
+    argmax = argmax.reshape(R, PH, PW, C).transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(output), np.ascontiguousarray(argmax)
+
+
+def _feasible(start, end, roi_size, pooled_size, data_size):
+    """(R, pooled_size, data_size) mask of the pooled units that
+    ROIPoolBackward considers for each input position along one axis."""
+    bin_size = roi_size.astype(np.float32) / np.float32(pooled_size)
+    pos = np.arange(data_size)[np.newaxis, :]
+    rel = (pos - start[:, np.newaxis]).astype(np.float32)
+    pstart = np.floor(rel / bin_size[:, np.newaxis]).astype(np.int64)
+    pend = np.ceil((rel + 1) / bin_size[:, np.newaxis]).astype(np.int64)
+    pstart = np.clip(pstart, 0, pooled_size)
+    pend = np.clip(pend, 0, pooled_size)
+    in_roi = (pos >= start[:, np.newaxis]) & (pos <= end[:, np.newaxis])
+    p = np.arange(pooled_size)[np.newaxis, :, np.newaxis]
+    return (p >= pstart[:, np.newaxis, :]) & (p < pend[:, np.newaxis, :]) & \
+        in_roi[:, np.newaxis, :]
+
+
+def _feasible_bins(feasible, lo, hi):
+    """(R, pooled_size) mask of the bins [lo, hi) whose every position is
+    feasible."""
+    R, P, _ = feasible.shape
+    counts = np.zeros((R, P, feasible.shape[2] + 1), dtype=np.int64)
+    np.cumsum(feasible, axis=2, out=counts[:, :, 1:])
+    r, p = np.arange(R)[:, np.newaxis], np.arange(P)[np.newaxis, :]
+    return counts[r, p, hi] - counts[r, p, lo] == np.maximum(hi - lo, 0)
+
+
+def roi_pool_backward(grad_output, rois, argmax, feature_shape,
+                      spatial_scale):
+    """Gradient (N, C, H, W) float32 of roi_pool_forward, given the
+    (R, C, PH, PW) grad_output and the argmax it returned.
+
+    Like ROIPoolBackward, a pooled unit only passes its gradient to its
+    argmax if that input lies inside the RoI and in the unit's feasible
+    bin range.
+    """
+    N, C, H, W = feature_shape
+    grad_output = np.asarray(grad_output, dtype=np.float32)
+    rois = np.asarray(rois)
+    R, _, PH, PW = grad_output.shape
+    size = C * H * W
+
+    start_w, start_h, end_w, end_h, roi_width, roi_height = \
+        _roi_geometry(rois, spatial_scale)
+    feasible_h = _feasible(start_h, end_h, roi_height, PH, H)
+    feasible_w = _feasible(start_w, end_w, roi_width, PW, W)
+
+    # Units that pass nothing are routed to an extra, dropped slot
+    batch_inds = rois[:, 0].astype(np.int64)
+    index = argmax + (batch_inds * size)[:, np.newaxis, np.newaxis,
+                                         np.newaxis]
+    drop = argmax < 0
+    # Every position of a bin is feasible, except for float rounding at bin
+    # edges and for malformed RoIs; only the other bins are checked per unit
+    hstart, hend = _bin_bounds(start_h, roi_height, PH, H)
+    wstart, wend = _bin_bounds(start_w, roi_width, PW, W)
+    checked = _feasible_bins(feasible_h, hstart, hend)[:, :, np.newaxis] & \
+        _feasible_bins(feasible_w, wstart, wend)[:, np.newaxis, :]
+    if not checked.all():
+        r, ph, pw = np.nonzero(~checked)
+        # (bins, C) positions of the units of those bins
+        pos = argmax.transpose(0, 2, 3, 1)[r, ph, pw]
+        h, w = pos // W % H, pos % W
+        feasible = feasible_h[r[:, np.newaxis], ph[:, np.newaxis], h] & \
+            feasible_w[r[:, np.newaxis], pw[:, np.newaxis], w]
+        drop.transpose(0, 2, 3, 1)[r, ph, pw] |= ~feasible
+    index[drop] = N * size
+
+    grad = np.bincount(index.ravel(), weights=grad_output.ravel(),
+                       minlength=N * size + 1)
+    return grad[:-1].astype(np.float32).reshape(N, C, H, W)
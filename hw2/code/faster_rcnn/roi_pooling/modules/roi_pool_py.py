@@ -14,7 +14,7 @@ class RoIPool(nn.Module):
     def forward(self, features, rois):
         batch_size, num_channels, data_height, data_width = features.size()
         num_rois = rois.size()[0]
-        outputs = Variable(torch.zeros(num_rois, num_channels, self.pooled_height, self.pooled_width)).cuda()
+        outputs = Variable(features.data.new(num_rois, num_channels, self.pooled_height, self.pooled_width).zero_())
 
         for roi_ind, roi in enumerate(rois):
             batch_ind = int(roi[0].data[0])
@@ -165,9 +165,12 @@ __global__ void ROIPoolBackward(const int nthreads, const float* top_diff,
             pwstart = fminf(fmaxf(pwstart, 0), pooled_width);
             pwend = fminf(fmaxf(pwend, 0), pooled_width);
 
+            // argmax_data is relative to the RoI's image (see ROIPoolForward),
+            // not to the whole batch like index
+            const int bottom_index = (c * height + h) * width + w;
             for (int ph = phstart; ph < phend; ++ph) {
                 for (int pw = pwstart; pw < pwend; ++pw) {
-                    if (offset_argmax_data[(c * pooled_height + ph) * pooled_width + pw] == index)
+                    if (offset_argmax_data[(c * pooled_height + ph) * pooled_width + pw] == bottom_index)
                     {
                         gradient += offset_top_diff[(c * pooled_height + ph) * pooled_width + pw];
                     }
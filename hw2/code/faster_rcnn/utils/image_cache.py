@@ -0,0 +1,143 @@
+"""Cache of decoded, resized images shared by training and testing.
+
+Images are stored as uint8 at their blob scale, keyed by (path, target size,
+max size); flipped images are views of the unflipped entry. Mean/std
+normalization is applied in float32 when a blob image is requested.
+
+There are two tiers:
+  - an in-RAM LRU of decoded images with a byte budget (per process; the
+    prefetch workers of roi_data_layer split cfg.IMAGE_CACHE_MB), and
+  - an optional directory of .npy files of the resized images. They are
+    memory-mapped and returned as read-only views, which the OS page cache
+    shares between processes, so they are not copied into the LRU. Files are
+    written atomically, so several processes can fill the directory at the
+    same time, and are keyed by the source file's mtime so edited images are
+    not served stale.
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from fast_rcnn.config import cfg
+
+
+class ImageCache(object):
+    """Two-tier cache of uint8 images resized for a blob."""
+
+    def __init__(self, max_bytes=2 << 30, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, path, target_size, max_size, flipped=False):
+        """Return the image at path resized as in prep_im_for_blob (shortest
+        side target_size, longest side at most max_size) as a read-only
+        uint8 BGR array, and its scale factor."""
+        key = (path, target_size, max_size)
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.hits += 1
+            self._entries[key] = entry
+        else:
+            entry = self._load_cache_file(path, target_size, max_size)
+        if entry is None:
+            entry = self._load(path, target_size, max_size)
+            self._entries[key] = entry
+            self._bytes += entry[0].nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, (old, _) = self._entries.popitem(last=False)
+                self._bytes -= old.nbytes
+
+        im, im_scale = entry
+        if flipped:
+            im = im[:, ::-1, :]
+        return im, im_scale
+
+    def get_normalized(self, path, target_size, max_size, flipped=False,
+                       mean=np.zeros((1, 1, 3)), std=np.ones((1, 1, 3))):
+        """Like get, but returns the float32 image scaled to [0, 1] and
+        normalized by mean and std, ready for im_list_to_blob."""
+        im, im_scale = self.get(path, target_size, max_size, flipped)
+        scale = (1. / (255. * np.asarray(std))).astype(np.float32)
+        offset = (-np.asarray(mean) / np.asarray(std)).astype(np.float32)
+        im = im.astype(np.float32)
+        im *= scale
+        im += offset
+        return im, im_scale
+
+    def _load_cache_file(self, path, target_size, max_size):
+        """(read-only memory-mapped image, scale) from the disk tier, or None
+        if it is not there."""
+        if not self.cache_dir:
+            return None
+        cache_file = self._cache_file(path, target_size, max_size)
+        if not os.path.exists(cache_file):
+            return None
+        self.disk_hits += 1
+        record = np.load(cache_file, mmap_mode='r')
+        return record['im'][0], float(record['scale'][0])
+
+    def _load(self, path, target_size, max_size):
+        """(image, scale) decoded and resized, and written to the disk tier."""
+        self.misses += 1
+        im = cv2.imread(path)
+        if im is None:
+            raise IOError('Could not read image {}'.format(path))
+        im_size_min = np.min(im.shape[0:2])
+        im_size_max = np.max(im.shape[0:2])
+        im_scale = float(target_size) / float(im_size_min)
+        # Prevent the biggest axis from being more than MAX_SIZE
+        if np.round(im_scale * im_size_max) > max_size:
+            im_scale = float(max_size) / float(im_size_max)
+        im = cv2.resize(im, None, None, fx=im_scale, fy=im_scale,
+                        interpolation=cv2.INTER_LINEAR)
+        im.flags.writeable = False
+
+        if self.cache_dir:
+            cache_file = self._cache_file(path, target_size, max_size)
+            record = np.zeros(1, dtype=[('scale', np.float64),
+                                        ('im', np.uint8, im.shape)])
+            record['scale'] = im_scale
+            record['im'][0] = im
+            # np.save would append .npy to a name without it
+            tmp_file = '{}.{}.tmp.npy'.format(cache_file[:-4], os.getpid())
+            np.save(tmp_file, record)
+            os.rename(tmp_file, cache_file)
+        return im, im_scale
+
+    def _cache_file(self, path, target_size, max_size):
+        stat = os.stat(path)
+        key = '{}:{}:{}:{}:{}'.format(os.path.abspath(path), stat.st_mtime,
+                                      stat.st_size, target_size, max_size)
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + '.npy')
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return ('{} images, {:.0f} MB, {} hits, {} disk hits, {} misses'
+                .format(len(self), self._bytes / 2. ** 20, self.hits,
+                        self.disk_hits, self.misses))
+
+
+_image_cache = None
+
+def get_image_cache():
+    """The process-wide ImageCache configured by cfg.IMAGE_CACHE_MB and
+    cfg.IMAGE_CACHE_DIR. Processes that share the budget lower max_bytes."""
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = ImageCache(max_bytes=int(cfg.IMAGE_CACHE_MB) << 20,
+                                  cache_dir=cfg.IMAGE_CACHE_DIR or None)
+    return _image_cache
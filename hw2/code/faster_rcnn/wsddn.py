@@ -85,10 +85,16 @@ class WSDDN(nn.Module):
     @property
     def loss(self):
         return self.cross_entropy
+
+    @property
+    def is_cuda(self):
+        """Whether the network's parameters (and so its inputs) are on the
+        GPU; without one, RoI pooling runs on the CPU."""
+        return next(self.parameters()).is_cuda
 	
     def forward(self, im_data, rois, im_info, gt_vec=None,
                 gt_boxes=None, gt_ishard=None, dontcare_areas=None):
-        im_data = network.np_to_variable(im_data, is_cuda=True)
+        im_data = network.np_to_variable(im_data, is_cuda=self.is_cuda)
         im_data = im_data.permute(0, 3, 1, 2)
 	
         #TODO: Use im_data and rois as input
@@ -96,7 +102,13 @@ class WSDDN(nn.Module):
         # Checkout faster_rcnn.py for inspiration
         features = self.features(im_data)
         #from IPython.core.debugger import Tracer; Tracer()() 
-        rois = network.np_to_variable(rois, is_cuda=True)
+        # RoIs are grouped by image, with the image's index in the batch in
+        # column 0
+        num_rois = np.bincount(rois[:, 0].astype(np.int64),
+                               minlength=im_data.size(0))
+        assert np.all(np.diff(rois[:, 0]) >= 0), 'RoIs must be sorted by image'
+        assert np.all(num_rois > 0), 'Every image needs at least one RoI'
+        rois = network.np_to_variable(rois, is_cuda=self.is_cuda)
         roi_features1 =  self.roi_pool.forward(features,rois)  # should be a 4D tensor for single image or after flattening
         #print(roi_features1.size()) #(2997L, 256L, 6L, 6L)
         roi_features1 = roi_features1.view(-1, 9216)#2997 x 9216
@@ -108,36 +120,55 @@ class WSDDN(nn.Module):
         
         cls_score =  F.softmax(cls_score,dim=1)
         
- #       det_score = torch.traspose(det_score,dim=0)
-        det_score = F.softmax(det_score,dim=0)
-        #det_score = torch.traspose(det_score)
+        # The detection softmax is over the RoIs of each image separately
+        det_score = torch.cat([F.softmax(segment, dim=0)
+                               for segment in self._split_rois(det_score,
+                                                               num_rois)])
         
         cls_prob = torch.mul(det_score,cls_score)
         
         if self.training:
-            label_vec = network.np_to_variable(gt_vec, is_cuda=True)
-            label_vec = label_vec.view(self.n_classes,-1)
-            self.cross_entropy = self.build_loss(cls_prob, label_vec)
+            label_vec = network.np_to_variable(gt_vec, is_cuda=self.is_cuda)
+            label_vec = label_vec.view(-1, self.n_classes)
+            self.cross_entropy = self.build_loss(cls_prob, label_vec,
+                                                 num_rois)
         return cls_prob
+
+    @staticmethod
+    def _split_rois(x, num_rois):
+        """Split the rows of x into the consecutive segments of each image."""
+        segments = []
+        start = 0
+        for n in num_rois:
+            segments.append(x.narrow(0, start, int(n)))
+            start += int(n)
+        return segments
     
-    def build_loss(self, cls_prob, label_vec):
+    def build_loss(self, cls_prob, label_vec, num_rois=None):
         """Computes the loss
 
         :cls_prob: N_roix20 output scores
-        :label_vec: 1x20 one hot label vector 
-        :returns: loss
+        :label_vec: N_imagesx20 one hot label vectors
+        :num_rois: number of RoIs of each image (all of them belong to one
+            image if None)
+        :returns: loss, summed over classes and images (as for one image,
+            so LEARNING_RATE keeps its per-image meaning)
 
         """
         #TODO: Compute the appropriate loss using the cls_prob that is the
         #output of forward()
         #Checkout forward() to see how it is called
         #sum over regions and compute loss wrt to label_vec
-        cls_prob = torch.sum(cls_prob, dim=0)
+        if num_rois is None:
+            num_rois = [cls_prob.size(0)]
+        # N_images x 20 image-level scores
+        cls_prob = torch.stack([torch.sum(segment, dim=0) for segment
+                                in self._split_rois(cls_prob, num_rois)])
         cls_prob_sum = torch.clamp(cls_prob, min=0,max=1)
         loss_cls = torch.nn.BCELoss(size_average=False)
         loss = loss_cls(cls_prob_sum, label_vec)
 
-	return loss
+        return loss
 
     def get_image_blob_noscale(self, im):
         im_orig = im.astype(np.float32, copy=True)
@@ -5,6 +5,8 @@ import time
 import sys
 sys.path.insert(0,'../faster_rcnn')
 sys.path.insert(0,'../')
+# average_precision and APAccumulator are shared with hw1/eval.py
+sys.path.append('../../../hw1')
 
 import sklearn
 import sklearn.metrics
@@ -25,6 +27,7 @@ import torchvision.models as models
 
 from datasets.factory import get_imdb
 from custom import *
+from eval import average_precision, APAccumulator
 from logger import *
 
 import numpy as np
@@ -212,7 +215,7 @@ def train(train_loader, model, criterion, optimizer, epoch, logger_t, logger_v):
         #print(output.size())
         max_out = F.max_pool2d(output, kernel_size=output.size()[-1])
         #print(output.size())
-        imoutput = max_out.squeeze()
+        imoutput = max_out.view(max_out.size(0), -1)
         #imoutput = out.transpose(1,2)
         
         loss = criterion(imoutput, target_var)
@@ -316,6 +319,8 @@ def validate(val_loader, model, criterion, logger_t, logger_v, epoch):
     losses = AverageMeter()
     avg_m1 = AverageMeter()
     avg_m2 = AverageMeter()
+    # mAP over the whole set rather than the mean of per-batch mAPs
+    ap_meter = APAccumulator(num_classes=len(val_loader.dataset.classes))
 
     # switch to evaluate mode
     model.eval()
@@ -335,7 +340,7 @@ def validate(val_loader, model, criterion, logger_t, logger_v, epoch):
 
         output = model(input_var)
         max_out = F.max_pool2d(output, kernel_size=output.size()[-1])
-        imoutput = max_out.squeeze()
+        imoutput = max_out.view(max_out.size(0), -1)
         
 #         max_out = nn.max_pool2d(output, kernel_size=(output.size()[-1],output.size()[-1])
 #         max_out = global_max(max_out)
@@ -348,6 +353,7 @@ def validate(val_loader, model, criterion, logger_t, logger_v, epoch):
         # measure metrics and record loss
         m1 = metric1(imoutput.data, target)
         m2 = metric2(imoutput.data, target)
+        ap_meter.update(target.cpu().numpy(), imoutput.data.cpu().numpy())
         losses.update(loss.data[0], input.size(0))
         avg_m1.update(m1[0], input.size(0))
         avg_m2.update(m2[0], input.size(0))
@@ -419,8 +425,10 @@ def validate(val_loader, model, criterion, logger_t, logger_v, epoch):
                         ### Visdom
             
 
-    print(' * Metric1 {avg_m1.avg:.3f} Metric2 {avg_m2.avg:.3f}'
-          .format(avg_m1=avg_m1, avg_m2=avg_m2))
+    val_map = ap_meter.mean_ap()
+    print(' * Metric1 {avg_m1.avg:.3f} Metric2 {avg_m2.avg:.3f} mAP {val_map:.3f}'
+          .format(avg_m1=avg_m1, avg_m2=avg_m2, val_map=val_map))
+    logger_t.scalar_summary(tag= 'val_epoch_mAP', value= val_map, step= global_step)
 
     return avg_m1.avg, avg_m2.avg
 
@@ -471,23 +479,10 @@ def metric1(output, target):
     #from IPython.core.debugger import Tracer; Tracer()()
 
     target = np.array(target)
-    #print(target.shape)
     output = np.array(output)
-    all_ap = np.zeros((target.shape[1]))
-    nclasses = target.shape[1]
-    #print(output.shape)
-
-    for cls in range(nclasses):
-        
-        gt = target[:,cls]
-        pred = output[:,cls]
-        pred -= 1e-5 * gt    # Subtract eps from score to make AP work for tied scores
-        all_ap[cls] = sklearn.metrics.average_precision_score(gt, pred, average=None)
-    all_ap_final = []
-    for i in range(len(all_ap)):
-        if not np.isnan(all_ap[i]):
-            all_ap_final.append(all_ap[i])
-    ans = np.mean(np.array(all_ap_final))
+    # Subtracts eps from positives' scores to make AP work for tied scores
+    all_ap = average_precision(target, output)
+    ans = np.mean(all_ap[~np.isnan(all_ap)])
     return [ans]
 
 def metric2(output, target,th = 0.2):
@@ -18,6 +18,8 @@ from fast_rcnn.nms_wrapper import nms
 from fast_rcnn.bbox_transform import bbox_transform_inv, clip_boxes
 from datasets.factory import get_imdb
 from fast_rcnn.config import cfg, cfg_from_file, get_output_dir
+from utils.blob import im_list_to_blob
+from utils.image_cache import get_image_cache
 
 # hyper-parameters
 # ------------
@@ -55,15 +57,40 @@ def vis_detections(im, class_name, dets, thresh=0.04):
     return im
 
 
+def get_image_blob(net, im_path):
+    """Same as net.get_image_blob(cv2.imread(im_path)), with the decoded and
+    resized images taken from the image cache."""
+    image_cache = get_image_cache()
+    processed_ims = []
+    im_scale_factors = []
+    mean=np.array([[[0.485, 0.456, 0.406]]])
+    std=np.array([[[0.229, 0.224, 0.225]]])
+    for target_size in net.SCALES:
+        im, im_scale = image_cache.get_normalized(im_path, target_size,
+                                                  net.MAX_SIZE,
+                                                  mean=mean,
+                                                  std=std)
+        im_scale_factors.append(im_scale)
+        processed_ims.append(im)
+
+    blob = im_list_to_blob(processed_ims)
+
+    return blob, np.array(im_scale_factors)
+
+
 def im_detect(net, image, rois):
     """Detect object classes in an image given object proposals.
+    image is either the image or its path; paths go through the image cache.
     Returns:
         scores (ndarray): R x K array of object class scores (K includes
             background as object category 0)
         boxes (ndarray): R x (4*K) array of predicted bounding boxes
     """
 
-    im_data, im_scales = net.get_image_blob(image)
+    if isinstance(image, basestring):
+        im_data, im_scales = get_image_blob(net, image)
+    else:
+        im_data, im_scales = net.get_image_blob(image)
     rois = np.hstack((np.zeros((rois.shape[0],1)),rois*im_scales[0]))
     im_info = np.array(
         [[im_data.shape[1], im_data.shape[2], im_scales[0]]],
@@ -77,7 +104,8 @@ def im_detect(net, image, rois):
         # Apply bounding-box regression deltas
         box_deltas = bbox_pred.data.cpu().numpy()
         pred_boxes = bbox_transform_inv(boxes, box_deltas)
-        pred_boxes = clip_boxes(pred_boxes, image.shape)
+        im_shape = np.round(np.array(im_data.shape[1:3]) / im_scales[0])
+        pred_boxes = clip_boxes(pred_boxes, im_shape)
     else:
         # Simply repeat the boxes, once for each class
         pred_boxes = np.tile(boxes, (1, scores.shape[1]))
@@ -105,14 +133,15 @@ def test_net(name, net, imdb, max_per_image=300, thresh=1e-4, visualize=False,
     #from IPython.core.debugger import Tracer; Tracer()()
 
     for i in range(num_images):
-        im = cv2.imread(imdb.image_path_at(i))
         rois = imdb.roidb[i]['boxes']
         _t['im_detect'].tic()
-        scores, boxes = im_detect(net, im, rois)
+        scores, boxes = im_detect(net, imdb.image_path_at(i), rois)
         detect_time = _t['im_detect'].toc(average=False)
 
         _t['misc'].tic()
         if visualize:
+            # Only decoded at full resolution for drawing
+            im = cv2.imread(imdb.image_path_at(i))
             # im2show = np.copy(im[:, :, (2, 1, 0)])
             im2show = np.copy(im)
 
@@ -156,6 +185,7 @@ def test_net(name, net, imdb, max_per_image=300, thresh=1e-4, visualize=False,
     with open(det_file, 'wb') as f:
         cPickle.dump(all_boxes, f, cPickle.HIGHEST_PROTOCOL)
 
+    print('Image cache: {}'.format(get_image_cache().stats()))
     print('Evaluating detections')
     aps = imdb.evaluate_detections(all_boxes, output_dir)
     return aps
@@ -172,7 +202,8 @@ if __name__ == '__main__':
     network.load_net(trained_model, net)
     print('load model successfully!')
 
-    net.cuda()
+    if torch.cuda.is_available():
+        net.cuda()
     net.eval()
 
     # evaluation
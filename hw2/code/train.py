@@ -151,8 +151,9 @@ for name, param in pret_net.items():
                 
 #from IPython.core.debugger import Tracer; Tracer()()
 
-# Move model to GPU and set train mode
-net.cuda()
+# Move model to GPU (if there is one) and set train mode
+if torch.cuda.is_available():
+    net.cuda()
 net.train()
 
 
@@ -171,6 +172,8 @@ step_cnt = 0
 re_cnt = False
 t = Timer()
 t.tic()
+data_timer = Timer()
+data_wait = 0.
 
 logger_v = visdom.Visdom(server='http://localhost' ,port='8099')
 logger_t = Logger('./tboard', name='wsddn')
@@ -178,8 +181,10 @@ plotter = VisdomLinePlotter(env_name='main_wsddn_train')
 
 for step in range(start_step, end_step+1):
 
-    # get one batch
+    # get one batch, timing how long the step waits for it
+    data_timer.tic()
     blobs = data_layer.forward()
+    data_wait += data_timer.toc(average=False)
     #from IPython.core.debugger import Tracer; Tracer()() #labels may be none
     im_data = blobs['data']#1xhxwx3
     rois = blobs['rois']
@@ -202,8 +207,9 @@ for step in range(start_step, end_step+1):
     if step % disp_interval == 0:
         duration = t.toc(average=False)
         fps = step_cnt / duration
-        log_text = 'step %d, image: %s, loss: %.4f, fps: %.2f (%.2fs per batch), lr: %.9f, momen: %.4f, wt_dec: %.6f' % (
-            step, blobs['im_name'], train_loss / step_cnt, fps, 1./fps, lr, momentum, weight_decay)
+        log_text = 'step %d, image: %s, loss: %.4f, fps: %.2f (%.1f images/s, %.2fs per batch, %.3fs data wait), lr: %.9f, momen: %.4f, wt_dec: %.6f' % (
+            step, blobs['im_name'], train_loss / step_cnt, fps, fps * cfg.TRAIN.IMS_PER_BATCH, 1./fps, data_wait / step_cnt, lr, momentum, weight_decay)
+        logger_t.scalar_summary(tag='data_wait', value=data_wait / step_cnt, step=step)
         log_print(log_text, color='green', attrs=['bold'])
         re_cnt = True
 
@@ -251,6 +257,7 @@ for step in range(start_step, end_step+1):
     if re_cnt:
         tp, tf, fg, bg = 0., 0., 0, 0
         train_loss = 0
+        data_wait = 0.
         step_cnt = 0
         t.tic()
         re_cnt = False
@@ -0,0 +1,124 @@
+'''
+Columnar store for the HMDB51 ResNet18 feature pickles.
+
+A pickle (dict with key 'data': list of per-video dicts with keys
+class_num, class_name, features) is converted once into a directory:
+    features.npy     (N, 10, 512) float32 or float16
+    class_num.npy    (N,) int16, only for annotated sets
+    class_names.npy  (51,) str, class_names[class_num] is the class name
+The arrays are opened with mmap_mode='r', so loading takes milliseconds and
+only the rows that are used are paged in. load_embeddings adds pooled
+(N, 512) video embeddings (embeddings_<mean|max>.npy) to the same directory.
+
+Usage: python feature_store.py <set.p> [float32|float16]
+'''
+
+import os
+import sys
+import pickle
+import shutil
+import numpy as np
+
+
+def store_dir_for(pickle_file):
+    return os.path.splitext(pickle_file)[0] + '_store'
+
+
+def convert(pickle_file, store_dir=None, dtype=np.float32):
+    '''Convert pickle_file to a store in store_dir; returns store_dir.'''
+    if store_dir is None:
+        store_dir = store_dir_for(pickle_file)
+    with open(pickle_file, "rb",) as input_file:
+        data = pickle.load(input_file, encoding='bytes')[b'data']
+
+    tmp_dir = store_dir + '.tmp'
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    no_of_frames, feature_len = data[0][b'features'].shape
+    features = np.lib.format.open_memmap(
+        os.path.join(tmp_dir, 'features.npy'), mode='w+', dtype=dtype,
+        shape=(len(data), no_of_frames, feature_len))
+    for i, video in enumerate(data):
+        features[i] = video[b'features']
+    features.flush()
+    del features
+
+    if b'class_num' in data[0]:
+        class_num = np.array([video[b'class_num'] for video in data],
+                             dtype=np.int16)
+        class_names = [''] * (int(class_num.max()) + 1)
+        for video in data:
+            name = video[b'class_name']
+            if isinstance(name, bytes):
+                name = name.decode('utf-8')
+            class_names[video[b'class_num']] = name
+        np.save(os.path.join(tmp_dir, 'class_num.npy'), class_num)
+        np.save(os.path.join(tmp_dir, 'class_names.npy'),
+                np.array(class_names))
+
+    if os.path.isdir(store_dir):
+        shutil.rmtree(store_dir)
+    os.rename(tmp_dir, store_dir)
+    return store_dir
+
+
+def load_store(pickle_file, store_dir=None, dtype=np.float32):
+    '''
+    Open the store of pickle_file, converting it on first use.
+    Returns:
+        features (np.memmap): Read-only (N, 10, 512) array.
+        class_num (np.ndarray): (N,) int16, None for the test set.
+        class_names (np.ndarray): Class name per class_num, None for the
+            test set.
+    '''
+    if store_dir is None:
+        store_dir = store_dir_for(pickle_file)
+    if not os.path.isdir(store_dir):
+        convert(pickle_file, store_dir, dtype=dtype)
+
+    features = np.load(os.path.join(store_dir, 'features.npy'), mmap_mode='r')
+    class_num, class_names = None, None
+    if os.path.exists(os.path.join(store_dir, 'class_num.npy')):
+        class_num = np.load(os.path.join(store_dir, 'class_num.npy'),
+                            mmap_mode='r')
+        class_names = np.load(os.path.join(store_dir, 'class_names.npy'))
+    return features, class_num, class_names
+
+
+def load_embeddings(pickle_file, mode='mean', store_dir=None, chunk_size=1024):
+    '''
+    (N, 512) video embeddings, the frame features pooled over frames with
+    mode ('mean' or 'max'). Computed once from the store and then opened
+    with mmap_mode='r', for early-pooling models and downstream classifiers.
+    '''
+    if mode not in ('mean', 'max'):
+        raise ValueError('Only mean/max embeddings can be cached, got {}'
+                         .format(mode))
+    if store_dir is None:
+        store_dir = store_dir_for(pickle_file)
+    emb_file = os.path.join(store_dir, 'embeddings_{}.npy'.format(mode))
+    if not os.path.exists(emb_file):
+        features, _, _ = load_store(pickle_file, store_dir)
+        pool = np.mean if mode == 'mean' else np.max
+        tmp_file = emb_file + '.tmp.npy'
+        embeddings = np.lib.format.open_memmap(
+            tmp_file, mode='w+', dtype=features.dtype,
+            shape=(features.shape[0], features.shape[2]))
+        for start in range(0, len(features), chunk_size):
+            chunk = np.asarray(features[start:start + chunk_size],
+                               dtype=np.float32)
+            embeddings[start:start + len(chunk)] = pool(chunk, axis=1)
+        embeddings.flush()
+        del embeddings
+        os.rename(tmp_file, emb_file)
+    return np.load(emb_file, mmap_mode='r')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    dtype = np.dtype(sys.argv[2]) if len(sys.argv) > 2 else np.float32
+    print(convert(sys.argv[1], dtype=dtype))
@@ -0,0 +1,82 @@
+'''
+Test-set inference for saved hw3 models.
+
+Scores the memory-mapped test features with one or more saved models
+(PyTorch .pth from models.save_net, Keras .h5 from model.save) in large
+batches, optionally averages their class probabilities, and writes the
+predicted labels (one per line, as part1.x.txt expects) in a single write,
+plus a <name>_top5.txt with the top-5 classes and their probabilities.
+
+Usage:
+    python infer.py part1.1_net.pth --out part1.1.txt
+    python infer.py part1.1_net.pth part1.2_lstm.h5 --average --out part1.x.txt
+'''
+
+import os
+import argparse
+import numpy as np
+
+from feature_store import load_store
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='hw3 test-set inference')
+    parser.add_argument('models', type=str, nargs='+',
+                        help='.pth (PyTorch) and/or .h5 (Keras) models')
+    parser.add_argument('--test_set', type=str,
+                        default='randomized_annotated_test_set_no_name_no_num.p')
+    parser.add_argument('--out', type=str, default='part1.x.txt')
+    parser.add_argument('--batch_size', type=int, default=4096)
+    parser.add_argument('--average', action='store_true',
+                        help='Average the probabilities of all the models')
+    parser.add_argument('--top_k', type=int, default=5)
+    args = parser.parse_args()
+    if len(args.models) > 1 and not args.average:
+        parser.error('pass --average to ensemble several models')
+    return args
+
+
+def model_proba(path, features, batch_size=4096):
+    '''(N, classes) probabilities of the model saved at path.'''
+    if path.endswith('.h5'):
+        from keras.models import load_model
+        from keras_utils import FeatureSequence
+        model = load_model(path)
+        return model.predict_generator(
+            FeatureSequence(features, batch_size=batch_size))
+    from models import load_net, predict_proba
+    return predict_proba(load_net(path), features, batch_size=batch_size)
+
+
+def write_predictions(file_name, probs, top_k=5):
+    '''
+    Write argmax labels of probs (N, classes) to file_name, one per line,
+    and the top_k classes and probabilities per video to <name>_top<k>.txt.
+    '''
+    np.savetxt(file_name, np.argmax(probs, axis=1), fmt='%d')
+    if not top_k:
+        return
+    top = np.argpartition(-probs, top_k - 1, axis=1)[:, :top_k]
+    rows = np.arange(len(probs))[:, np.newaxis]
+    top = top[rows, np.argsort(-probs[rows, top], axis=1)]
+    table = np.hstack([top, probs[rows, top]])
+    stem, ext = os.path.splitext(file_name)
+    np.savetxt('{}_top{}{}'.format(stem, top_k, ext), table,
+               fmt=['%d'] * top_k + ['%.6f'] * top_k)
+
+
+def main():
+    args = parse_args()
+    features, _, _ = load_store(args.test_set)
+    probs = None
+    for path in args.models:
+        p = model_proba(path, features, batch_size=args.batch_size)
+        probs = p if probs is None else probs + p
+        print('{}: scored {} videos'.format(path, len(p)))
+    probs /= len(args.models)
+    write_predictions(args.out, probs, top_k=args.top_k)
+    print('Wrote {}'.format(args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import time
+import numpy as np
+from keras.callbacks import Callback
+from keras.layers import LSTM
+from keras.utils import Sequence
+
+'''
+Keras data feeding and LSTM helpers for task 1.2.
+'''
+
+
+class FeatureSequence(Sequence):
+    '''
+    float32 batches of (features, one-hot labels) straight from the
+    memory-mapped store, for fit_generator/predict_generator.
+    Only the rows of each batch are read, and nothing is converted ahead
+    of time, so no float64 or shuffled copy of the set is ever made.
+    Args:
+        features: (N, frames, 512) array or memmap.
+        y: (N, classes) one-hot labels, None for the test set.
+        indices: Rows of features to serve (e.g. the train split). Within
+            a batch, rows come in sorted order.
+        batch_size: Videos per batch; the last batch may be smaller.
+        shuffle: Reshuffle indices at the end of every epoch.
+    '''
+
+    def __init__(self, features, y=None, indices=None, batch_size=64,
+                 shuffle=False):
+        self.features = features
+        self.y = y
+        if indices is None:
+            indices = np.arange(len(features))
+        self.indices = np.array(indices)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        if shuffle:
+            np.random.shuffle(self.indices)
+
+    def __len__(self):
+        return (len(self.indices) + self.batch_size - 1) // self.batch_size
+
+    def __getitem__(self, i):
+        # Sorted rows read the memmap in file order; the batch order
+        # itself does not matter
+        idx = np.sort(self.indices[i * self.batch_size:
+                                   (i + 1) * self.batch_size])
+        x = np.asarray(self.features[idx], dtype=np.float32)
+        if self.y is None:
+            return x
+        return x, np.asarray(self.y[idx], dtype=np.float32)
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.indices)
+
+
+class EpochTimer(Callback):
+    '''Records the wall time of every epoch; summary() prints the mean.'''
+
+    def on_train_begin(self, logs=None):
+        self.times = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.time()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.times.append(time.time() - self._start)
+
+    def summary(self, name=''):
+        # The first epoch includes graph building, so it is left out of the
+        # mean when there is more than one
+        times = self.times[1:] if len(self.times) > 1 else self.times
+        print('{} epoch time: {:.2f}s mean, {:.2f}s first, {} epochs'.format(
+            name, np.mean(times), self.times[0], len(self.times)))
+
+
+def build_lstm(units, kernel='standard', **kwargs):
+    '''
+    LSTM layer of the given kernel configuration.
+    standard: Keras' default LSTM.
+    fused: implementation=2, computing all four gates in one matmul per step,
+        with sigmoid recurrent activation so the weights match the cuDNN
+        layout and can be loaded into CuDNNLSTM (and back).
+    cudnn: CuDNNLSTM, the fused cuDNN kernel (GPU only).
+    '''
+    if kernel == 'standard':
+        return LSTM(units, **kwargs)
+    if kernel == 'fused':
+        return LSTM(units, implementation=2, activation='tanh',
+                    recurrent_activation='sigmoid', unroll=False, **kwargs)
+    if kernel == 'cudnn':
+        from keras.layers import CuDNNLSTM
+        return CuDNNLSTM(units, **kwargs)
+    raise ValueError('Unknown LSTM kernel: {}'.format(kernel))
@@ -0,0 +1,61 @@
+import numpy as np
+import torch
+
+
+class MinibatchIterator(object):
+    '''
+    Shuffled minibatches over an in-memory training set.
+    x is stored once as a contiguous float32 tensor and y as class indices.
+    Each epoch only draws a new permutation, and every batch is gathered
+    with index_select into a preallocated (pinned, when CUDA is available)
+    buffer. There are no per-epoch copies of the data and no per-batch dtype
+    conversion.
+    Note: the yielded tensors are views of that buffer and are overwritten
+    by the next batch.
+    Args:
+        x: (N, ...) array of features.
+        y: (N,) class indices or (N, C) one-hot labels.
+        batch_size: Videos per batch.
+        shuffle: Draw a new permutation every epoch.
+        drop_last: Skip the final partial batch.
+        pin_memory: Pin the batch buffers; defaults to torch.cuda.is_available().
+    '''
+
+    def __init__(self, x, y, batch_size=64, shuffle=True, drop_last=True,
+                 pin_memory=None):
+        y = np.asarray(y)
+        if y.ndim == 2:
+            y = np.argmax(y, axis=1)
+        self.x = torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32))
+        self.y = torch.from_numpy(np.ascontiguousarray(y, dtype=np.int64))
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        if pin_memory is None:
+            pin_memory = torch.cuda.is_available()
+
+        self._x_buf = self.x.new(batch_size, *self.x.size()[1:])
+        self._y_buf = self.y.new(batch_size)
+        if pin_memory:
+            self._x_buf = self._x_buf.pin_memory()
+            self._y_buf = self._y_buf.pin_memory()
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.y) // self.batch_size
+        return (len(self.y) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        N = len(self.y)
+        if self.shuffle:
+            order = torch.randperm(N)
+        else:
+            order = torch.arange(0, N).long()
+        for i in range(len(self)):
+            idx = order[i * self.batch_size:(i + 1) * self.batch_size]
+            n = len(idx)
+            x_batch = self._x_buf[:n]
+            y_batch = self._y_buf[:n]
+            torch.index_select(self.x, 0, idx, out=x_batch)
+            torch.index_select(self.y, 0, idx, out=y_batch)
+            yield x_batch, y_batch
@@ -0,0 +1,128 @@
+import math
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch import from_numpy
+from torch import max as torch_max
+from torch import mean as torch_mean
+from torch.autograd import Variable
+
+'''
+Pytorch models for task 1.1, shared by tast_1_1_final.py and sweep.py.
+'''
+
+
+class TemporalPooling(nn.Module):
+    '''
+    Pools (N, frames, C) values over frames into (N, C).
+    mode: 'mean', 'max' or 'attention'. Attention weights come from a
+        linear score of each frame's features (N, frames, feature_len),
+        softmaxed over frames.
+    '''
+    def __init__(self, mode='mean', feature_len=512):
+        super(TemporalPooling, self).__init__()
+        if mode not in ('mean', 'max', 'attention'):
+            raise ValueError('Unknown pooling: {}'.format(mode))
+        self.mode = mode
+        if mode == 'attention':
+            self.att = nn.Linear(in_features=feature_len, out_features=1)
+
+    def forward(self, values, features=None):
+        if self.mode == 'mean':
+            return torch_mean(values, 1)
+        if self.mode == 'max':
+            return torch_max(values, 1)[0]
+        if features is None:
+            features = values
+        # size N x frames
+        weights = F.softmax(self.att(features).squeeze(2), dim=1)
+        return (values * weights.unsqueeze(2)).sum(1)
+
+
+class Net(nn.Module):
+    '''
+    Per-frame MLP with temporal pooling; returns (N, classes) scores.
+    hidden: sizes of the hidden layers of fc1.
+    pooling: 'mean', 'max' or 'attention' (see TemporalPooling).
+    early: Pool the frame features before fc1 instead of pooling the
+        per-frame scores, so fc1 runs once per video instead of once per
+        frame. An early-pooling Net also takes already pooled (N, 512)
+        embeddings (see embed and feature_store.load_embeddings).
+    '''
+    def __init__(self, feature_len=512, no_of_frames=10, no_of_classes=51,
+                 hidden=(1024, 256), pooling='mean', early=False):
+        super(Net, self).__init__()
+        layers = []
+        in_features = feature_len
+        for out_features in hidden:
+            layers += [nn.Linear(in_features=in_features,
+                                 out_features=out_features),
+                       nn.ReLU(inplace=True)]
+            in_features = out_features
+        layers.append(nn.Linear(in_features=in_features,
+                                out_features=no_of_classes))
+        self.fc1 = nn.Sequential(*layers)
+        self.config = dict(feature_len=feature_len, no_of_frames=no_of_frames,
+                           no_of_classes=no_of_classes, hidden=tuple(hidden),
+                           pooling=pooling, early=early)
+        self.early = early
+        self.pool = TemporalPooling(pooling, feature_len=feature_len)
+
+    def embed(self, x):
+        '''(N, frames, 512) frame features -> (N, 512) video embeddings.'''
+        return self.pool(x, x)
+
+    def forward(self, x):
+        # size batch x 10 x 512 (or batch x 512 if already pooled)
+        if self.early:
+            if x.dim() == 3:
+                x = self.embed(x)
+            return self.fc1(x)
+        # size batch x 10 x 51, pooled to batch x 51
+        return self.pool(self.fc1(x), x)
+
+
+def init_weights(net):
+    '''Xavier-style normal init of every Linear in net.fc1.'''
+    for f in net.fc1:
+        if isinstance(f, nn.Linear):
+            sum_io = f.weight.size()[0] + f.weight.size()[1]
+            f.weight.data.normal_(0, math.sqrt(2.0 / sum_io))
+    return net
+
+
+def save_net(net, path):
+    '''Save net's weights together with the arguments needed to rebuild it.'''
+    torch.save({'config': net.config, 'state_dict': net.state_dict()}, path)
+
+
+def load_net(path):
+    '''Net saved with save_net, in eval mode.'''
+    checkpoint = torch.load(path, map_location=lambda storage, loc: storage)
+    net = Net(**checkpoint['config'])
+    net.load_state_dict(checkpoint['state_dict'])
+    return net.eval()
+
+
+def predict_proba(net, x, batch_size=1024):
+    '''
+    (N, classes) float32 class probabilities for x (N, frames, features), or
+    (N, features) embeddings for an early-pooling net. Scored batch_size
+    videos at a time without building an autograd graph.
+    '''
+    probs = None
+    for start in range(0, len(x), batch_size):
+        x_batch = np.ascontiguousarray(x[start:start + batch_size],
+                                       dtype=np.float32)
+        inputs = Variable(from_numpy(x_batch), volatile=True)
+        outputs = F.softmax(net(inputs), dim=1).data.cpu().numpy()
+        if probs is None:
+            probs = np.zeros((len(x), outputs.shape[1]), dtype=np.float32)
+        probs[start:start + len(x_batch)] = outputs
+    return probs
+
+
+def predict(net, x, batch_size=1024):
+    '''Predicted class of every video in x; see predict_proba.'''
+    return np.argmax(predict_proba(net, x, batch_size=batch_size), axis=1)
@@ -0,0 +1,252 @@
+'''
+Hyperparameter sweep for the hw3 action classifiers.
+
+The feature store is read once in the parent and the train/val split is
+copied into shared memory, so every worker sees the same arrays without
+copying or unpickling them. Each configuration in the grid runs in a
+process pool, and each worker is limited to --threads torch/TensorFlow
+threads (and BLAS threads, with threadpoolctl installed).
+Validation accuracy and wall time are collected into a single table.
+
+Usage:
+    python sweep.py --model mlp --lr 1e-4 1e-3 --weight_decay 0 1e-5 \
+        --epochs 40 80 --workers 8 --threads 1
+'''
+
+import os
+import csv
+import time
+import argparse
+import itertools
+import multiprocessing
+import numpy as np
+
+from feature_store import load_store
+
+no_of_classes = 51
+
+# Set in each worker by _init_worker
+_data = {}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Parallel hyperparameter sweep for hw3')
+    parser.add_argument('--train_set', type=str, default='annotated_train_set.p')
+    parser.add_argument('--model', type=str, nargs='+', default=['mlp'],
+                        choices=['mlp', 'lstm'])
+    parser.add_argument('--lr', type=float, nargs='+', default=[0.0001])
+    parser.add_argument('--weight_decay', type=float, nargs='+', default=[0.])
+    parser.add_argument('--epochs', type=int, nargs='+', default=[80])
+    parser.add_argument('--batch_size', type=int, nargs='+', default=[64])
+    parser.add_argument('--hidden', type=str, nargs='+', default=['1024,256'],
+                        help='mlp: comma separated hidden sizes, lstm: units')
+    parser.add_argument('--pooling', type=str, nargs='+', default=['mean'],
+                        choices=['mean', 'max', 'attention', 'early_mean',
+                                 'early_max', 'early_attention'],
+                        help='mlp temporal pooling, early_* pools before fc1')
+    parser.add_argument('--split_ratio', type=float, default=0.8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processes (default: CPUs // threads)')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Threads per worker')
+    parser.add_argument('--out', type=str, default='sweep_results.csv')
+    return parser.parse_args()
+
+
+def make_configs(args):
+    keys = ['model', 'lr', 'weight_decay', 'epochs', 'batch_size', 'hidden',
+            'pooling']
+    return [dict(zip(keys, values)) for values in itertools.product(
+        args.model, args.lr, args.weight_decay, args.epochs,
+        args.batch_size, args.hidden, args.pooling)]
+
+
+def _shared_copy(array):
+    '''float32 copy of array in shared memory, and its shape.'''
+    raw = multiprocessing.RawArray('f', int(np.prod(array.shape)))
+    np.frombuffer(raw, dtype=np.float32).reshape(array.shape)[...] = array
+    return raw, array.shape
+
+
+def _limit_threads(threads):
+    '''
+    Cap the threads of the libraries the workers load. The environment
+    variables only reach libraries that are initialised after they are set,
+    so this runs in the parent before the pool is created (torch and
+    TensorFlow are first imported in the workers).
+    '''
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+    os.environ['OPENBLAS_NUM_THREADS'] = str(threads)
+
+
+def _init_worker(shared, threads):
+    try:
+        # NumPy's BLAS was initialised in the parent, before _limit_threads
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+    _data['threads'] = threads
+    for name, (raw, shape) in shared.items():
+        _data[name] = np.frombuffer(raw, dtype=np.float32).reshape(shape)
+
+
+def _run_mlp(config):
+    import torch
+    import torch.nn as nn
+    import torch.optim as optim
+    from torch.autograd import Variable
+    from minibatch import MinibatchIterator
+    from models import Net, init_weights, predict
+    torch.set_num_threads(_data['threads'])
+
+    x_train, y_train = _data['x_train'], _data['y_train']
+    x_val, y_val = _data['x_val'], _data['y_val']
+    hidden = [int(h) for h in config['hidden'].split(',')]
+    pooling = config['pooling']
+    early = pooling.startswith('early_')
+    if early:
+        pooling = pooling[len('early_'):]
+    net = init_weights(Net(feature_len=x_train.shape[2],
+                           no_of_frames=x_train.shape[1],
+                           no_of_classes=no_of_classes, hidden=hidden,
+                           pooling=pooling, early=early))
+    if early and pooling != 'attention':
+        # Parameter-free pooling: train on the pooled video embeddings
+        pool = np.mean if pooling == 'mean' else np.max
+        x_train, x_val = pool(x_train, axis=1), pool(x_val, axis=1)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(net.parameters(), lr=config['lr'],
+                           weight_decay=config['weight_decay'])
+    batches = MinibatchIterator(x_train, y_train,
+                                batch_size=config['batch_size'])
+    y_val = np.argmax(y_val, axis=1)
+
+    val_accs = []
+    for epoch in range(config['epochs']):
+        for x_batch, y_batch in batches:
+            optimizer.zero_grad()
+            outputs = net(Variable(x_batch))
+            loss = criterion(outputs, Variable(y_batch))
+            loss.backward()
+            optimizer.step()
+        val_accs.append(np.mean(predict(net, x_val) == y_val))
+    return val_accs
+
+
+def _run_lstm(config):
+    import tensorflow as tf
+    from keras import backend as K
+    from keras.models import Sequential
+    from keras.layers import Dense, LSTM
+    from keras.optimizers import Adam
+    from keras.regularizers import l2
+    K.set_session(tf.Session(config=tf.ConfigProto(
+        intra_op_parallelism_threads=_data['threads'],
+        inter_op_parallelism_threads=1)))
+
+    x_train, y_train = _data['x_train'], _data['y_train']
+    regularizer = l2(config['weight_decay']) if config['weight_decay'] else None
+    model = Sequential()
+    model.add(LSTM(int(config['hidden'].split(',')[0]),
+                   input_shape=x_train.shape[1:],
+                   kernel_regularizer=regularizer))
+    model.add(Dense(no_of_classes, activation='softmax',
+                    kernel_regularizer=regularizer))
+    model.compile(loss='categorical_crossentropy',
+                  optimizer=Adam(lr=config['lr']), metrics=['accuracy'])
+    history = model.fit(x_train, y_train,
+                        validation_data=(_data['x_val'], _data['y_val']),
+                        epochs=config['epochs'],
+                        batch_size=config['batch_size'], verbose=0)
+    K.clear_session()
+    return history.history['val_acc']
+
+
+def run_config(config):
+    '''Train one configuration; returns config plus its results.'''
+    start = time.time()
+    if config['model'] == 'mlp':
+        val_accs = _run_mlp(config)
+    else:
+        val_accs = _run_lstm(config)
+    result = dict(config)
+    result['val_acc'] = float(val_accs[-1])
+    result['best_val_acc'] = float(np.max(val_accs))
+    result['best_epoch'] = int(np.argmax(val_accs)) + 1
+    result['seconds'] = time.time() - start
+    return result
+
+
+def print_table(results, columns):
+    widths = [max(len(c), max(len('{}'.format(_fmt(r[c]))) for r in results))
+              for c in columns]
+    print('  '.join(c.rjust(w) for c, w in zip(columns, widths)))
+    for r in results:
+        print('  '.join('{}'.format(_fmt(r[c])).rjust(w)
+                        for c, w in zip(columns, widths)))
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return '{:.4g}'.format(value)
+    return value
+
+
+def main():
+    args = parse_args()
+    configs = make_configs(args)
+
+    features, class_num, _ = load_store(args.train_set)
+    no_of_videos = len(class_num)
+    P = np.random.RandomState(args.seed).permutation(no_of_videos)
+    no_of_train = int(no_of_videos * args.split_ratio)
+    y = np.zeros((no_of_videos, no_of_classes), dtype=np.float32)
+    y[np.arange(no_of_videos), class_num] = 1
+    shared = {
+        'x_train': _shared_copy(features[np.sort(P[:no_of_train])]),
+        'y_train': _shared_copy(y[np.sort(P[:no_of_train])]),
+        'x_val': _shared_copy(features[np.sort(P[no_of_train:])]),
+        'y_val': _shared_copy(y[np.sort(P[no_of_train:])]),
+    }
+
+    workers = args.workers
+    if workers is None:
+        workers = max(1, multiprocessing.cpu_count() // args.threads)
+    workers = min(workers, len(configs))
+    print('{} configs on {} workers x {} threads'.format(
+        len(configs), workers, args.threads))
+
+    start = time.time()
+    results = []
+    _limit_threads(args.threads)
+    pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                initargs=(shared, args.threads))
+    try:
+        for result in pool.imap_unordered(run_config, configs):
+            results.append(result)
+            print('[{}/{}] {} val_acc {:.3f} ({:.0f}s)'.format(
+                len(results), len(configs),
+                ' '.join('{}={}'.format(k, result[k]) for k in sorted(configs[0])),
+                result['val_acc'], result['seconds']))
+    finally:
+        pool.close()
+        pool.join()
+
+    results.sort(key=lambda r: -r['best_val_acc'])
+    columns = ['model', 'hidden', 'pooling', 'lr', 'weight_decay', 'epochs',
+               'batch_size', 'val_acc', 'best_val_acc', 'best_epoch', 'seconds']
+    print_table(results, columns)
+    with open(args.out, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(results)
+    print('Sweep took {:.0f}s; results in {}'.format(time.time() - start,
+                                                     args.out))
+
+
+if __name__ == '__main__':
+    main()
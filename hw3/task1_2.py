@@ -1,4 +1,6 @@
-import pickle
+from feature_store import load_store
+from keras_utils import FeatureSequence, EpochTimer, build_lstm
+from infer import write_predictions
 from keras.models import Sequential
 from keras.layers import Dense
 from keras.layers import LSTM, Dropout
@@ -13,55 +15,59 @@ Loading data
 Data is list of dictionaries (1 dict per video)
 each dict has keys: dict_keys([b'class_num', b'class_name', b'features'])
 data[0][b'features'].shape: (10, 512)
+The pickles are converted once to a memory-mapped columnar store
+(see feature_store.py): features (N, 10, 512) float32, class_num (N,)
 
 Ref: https://stackoverflow.com/questions/28218466/unpickling-a-python-2-object-with-python-3
 '''
-with open('annotated_train_set.p', "rb",) as input_file:
-    data = pickle.load(input_file, encoding='bytes')
-
+features, class_num, class_names = load_store('annotated_train_set.p')
 no_of_classes = 51
-data = data[b'data']
-no_of_frames, feature_len = data[0][b'features'].shape
-
-no_of_videos = len(data)
-x = np.zeros((no_of_videos, no_of_frames, feature_len))
-y = np.zeros((no_of_videos,no_of_classes))
-class_map_dict = {}
-for i, video in enumerate(data):
-    x[i] = video[b'features']
-    y[i, video[b'class_num']] = 1
-    class_map_dict[video[b'class_num']] = video[b'class_name']
+no_of_videos, no_of_frames, feature_len = features.shape
+x = features
+y = np.zeros((no_of_videos, no_of_classes), dtype=np.float32)
+y[np.arange(no_of_videos), class_num] = 1
+class_map_dict = dict(enumerate(class_names))
 
 '''
 Random shuffling as keras val_split option takes last few samples from train 
 data sequentially
+feed: 'sequence' serves float32 batches of the shuffled 80/20 split straight
+      from the memmap store (FeatureSequence); 'fit' is the old
+      model.fit(x, y, validation_split=0.2) path, kept to compare epoch time.
 '''
+feed = 'sequence'
+batch_size = 64
 P = [i for i in range(no_of_videos)]
-x_shuf = np.zeros((no_of_videos, no_of_frames, feature_len))
-y_shuf = np.zeros((no_of_videos,no_of_classes))
 
 shuffle(P)
-x = x[P]
-y = y[P]
+if feed == 'fit':
+    x = x[P]
+    y = y[P]
+else:
+    no_of_train = int(no_of_videos * 0.8)
+    train_seq = FeatureSequence(features, y, P[:no_of_train],
+                                batch_size=batch_size, shuffle=True)
+    val_seq = FeatureSequence(features, y, P[no_of_train:],
+                              batch_size=batch_size)
 
 '''
 Load Test data
 '''
-with open('randomized_annotated_test_set_no_name_no_num.p', "rb",) as input_file:
-    test_data = pickle.load(input_file, encoding='bytes')
-test_data = test_data[b'data']
-
-x_test = np.zeros((len(test_data), no_of_frames, feature_len))
-for i, video in enumerate(test_data):
-    x_test[i] = video[b'features']
+x_test, _, _ = load_store('randomized_annotated_test_set_no_name_no_num.p')
 
 '''
 Keras model definition
 '''
 tbCallBack =TensorBoard(log_dir='./1_2_Graph', histogram_freq=0,
           write_graph=True, write_images=False)
+# lstm_kernel: 'standard' (Keras' default LSTM), or opt in to 'fused'
+# (cuDNN-compatible weights) or 'cudnn'. Those two use a sigmoid instead of
+# the default hard_sigmoid recurrent activation, so they train a different
+# model.
+lstm_kernel = 'standard'
 model = Sequential()
-model.add(LSTM(256, input_shape=(10, 512)))
+model.add(build_lstm(256, kernel=lstm_kernel,
+                     input_shape=(no_of_frames, feature_len)))
 #model.add(Dropout(0.2))
 model.add(Dense(no_of_classes, activation='softmax'))   #should be no of classes
 
@@ -71,22 +77,20 @@ model.compile(loss='categorical_crossentropy', optimizer=adam, metrics=['accurac
 
 
 #history = model.fit(X_train, y_train, validation_data=(X_test, y_test), epochs=100, batch_size=128, class_weight=class_weight)
-history = model.fit(x, y, validation_split=0.2, epochs=50, batch_size=64, callbacks=[tbCallBack])
+epoch_timer = EpochTimer()
+if feed == 'fit':
+    history = model.fit(x, y, validation_split=0.2, epochs=50, batch_size=batch_size, callbacks=[tbCallBack, epoch_timer])
+else:
+    history = model.fit_generator(train_seq, validation_data=val_seq, epochs=50, callbacks=[tbCallBack, epoch_timer])
+epoch_timer.summary('{} / {} LSTM'.format(feed, lstm_kernel))
 #best epochs = 50, sgd
 
 '''
 Writing test data predictions
 '''
-to_write = []
-outputs = model.predict(x_test)
-pred = np.argmax(outputs, axis=1)
-
-file_name = 'part1.2.txt'
-file = open(file_name, 'w')
-
-for i in pred:
-    file.write("%s\n" % i)
-file.close()
+model.save('part1.2_lstm.h5')
+outputs = model.predict_generator(FeatureSequence(x_test, batch_size=1024))
+write_predictions('part1.2.txt', outputs)
 
 
 # print(history.history.keys())
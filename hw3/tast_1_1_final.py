@@ -1,51 +1,53 @@
-import pickle
+from feature_store import load_store, load_embeddings
+from minibatch import MinibatchIterator
+from models import Net, init_weights, predict, predict_proba, save_net
+from infer import write_predictions
 from random import shuffle
 import matplotlib.pyplot as plt
 import numpy as np
 import torch.optim as optim
 from torch.autograd import Variable
 import torch.nn as nn
-import torch.nn.functional as F
-from torch import from_numpy
 from torch import max as torch_max
 from logger import *
 import math
 #with open('annotated_train_set.p', "rb",) as input_file:
-from torch import mean as torch_mean
 
 '''
 Loading data
 Data is list of dictionaries (1 dict per video)
 each dict has keys: dict_keys([b'class_num', b'class_name', b'features'])
 data[0][b'features'].shape: (10, 512)
+The pickles are converted once to a memory-mapped columnar store
+(see feature_store.py): features (N, 10, 512) float32, class_num (N,)
 
 Ref: https://stackoverflow.com/questions/28218466/unpickling-a-python-2-object-with-python-3
 '''
-with open('annotated_train_set.p', "rb",) as input_file:
-    data = pickle.load(input_file, encoding='bytes')
+features, class_num, class_names = load_store('annotated_train_set.p')
 no_of_classes = 51
-data = data[b'data']
-no_of_frames, feature_len = data[0][b'features'].shape
-
-no_of_videos = len(data)
-x = np.zeros((no_of_videos, no_of_frames, feature_len))
-y = np.zeros((no_of_videos, no_of_classes))
-class_map_dict = {}
-for i, video in enumerate(data):
-    x[i] = video[b'features']
-    y[i, video[b'class_num']] = 1
-    class_map_dict[video[b'class_num']] = video[b'class_name']
+no_of_videos, no_of_frames, feature_len = features.shape
+x = features
+y = np.zeros((no_of_videos, no_of_classes), dtype=np.float32)
+y[np.arange(no_of_videos), class_num] = 1
+class_map_dict = dict(enumerate(class_names))
 
 '''
 Load Test data
 '''
-with open('randomized_annotated_test_set_no_name_no_num.p', "rb",) as input_file:
-    test_data = pickle.load(input_file, encoding='bytes')
-test_data = test_data[b'data']
+x_test, _, _ = load_store('randomized_annotated_test_set_no_name_no_num.p')
 
-x_test = np.zeros((len(test_data), no_of_frames, feature_len))
-for i, video in enumerate(test_data):
-    x_test[i] = video[b'features']
+'''
+Temporal pooling: 'mean', 'max' or 'attention' over the 10 frames.
+Early pooling pools the frame features before fc1 (10x fewer classifier
+FLOPs); with mean/max the pooled 512-d video embeddings are cached in the
+store and used directly.
+'''
+pooling = 'mean'
+early_pooling = False
+if early_pooling and pooling != 'attention':
+    x = load_embeddings('annotated_train_set.p', pooling)
+    x_test = load_embeddings('randomized_annotated_test_set_no_name_no_num.p',
+                             pooling)
 
 
 '''
@@ -78,42 +80,9 @@ weight_decay = 0.00000
 logdir = './tboard_'+ 'batch_' '+ ''epochs_'+ str(no_of_epochs)+ '_lr_' + str(lr)+ '_wd_' + str(weight_decay)+ '_bn1d'
 print(logdir)
 logger_t = Logger(logdir)
-class Net(nn.Module):
-    def __init__(self):
-        super(Net, self).__init__()
-        self.fc1 = nn.Sequential(
-            nn.Linear(in_features= feature_len, out_features = 1024),
-            nn.ReLU(inplace=True),
-            nn.Linear(in_features= 1024, out_features = 256),
-            nn.ReLU(inplace=True),
-            nn.Linear(in_features= 256, out_features = no_of_classes),
-        )
-
-        self.p1 = nn.Sequential(
-            nn.AvgPool1d(no_of_frames, stride=None, padding=False, ceil_mode=False, count_include_pad=False),
-            #nn.MaxPool1d(no_of_frames, stride=None, padding=0, dilation=1, return_indices=False, ceil_mode=False),
-        )
-
-    def forward(self, x):
-
-        # size batchx 10x512
-        x = self.fc1(x)
-        # size bx10x51
-        #x = x.view(x.size()[0], x.size()[2], x.size()[1])
-        # size 1x51x10
-        #x = self.p1(x)
-        #size 1x51x1
-        #x = x.view(x.size()[0], x.size()[1])
-        #reshaping again as cross entropy needs NxC inp
-        #size 1 x 51
-        return x
-
-net = Net()
-for f in net.fc1:
-            if isinstance(f, nn.Linear):
-                #from IPython.core.debugger import Tracer; Tracer()()
-                sum_io = f.weight.size()[0] + f.weight.size()[1]
-                f.weight.data.normal_(0, math.sqrt(2.0 / sum_io))
+net = init_weights(Net(feature_len=feature_len, no_of_frames=no_of_frames,
+                      no_of_classes=no_of_classes, pooling=pooling,
+                      early=early_pooling))
 
 '''
 Training pytorch model
@@ -121,38 +90,31 @@ Training pytorch model
 criterion = nn.CrossEntropyLoss()
 #optimizer = optim.SGD(net.parameters(), lr=lr, momentum=0.9, weight_decay= weight_decay)
 optimizer = optim.Adam(net.parameters(), lr=lr)
-P = [i for i in range(len(y_train))]
-total = no_of_train
 batch_size = 64
-no_of_batches = math.floor(no_of_train/batch_size)
+eval_batch_size = 1024
 
-for epoch in range(no_of_epochs):  # loop over the dataset multiple times
-    #Shuffle
-    shuffle(P)
-    x_train = x_train[P]
-    y_train = y_train[P]
+train_batches = MinibatchIterator(x_train, y_train, batch_size=batch_size,
+                                  shuffle=True, drop_last=True)
 
+for epoch in range(no_of_epochs):  # loop over the dataset multiple times
     running_loss = 0.0
     correct = 0.0
-    total = no_of_train
-    for i in range(no_of_batches):
-        start = i*batch_size
-        end = start + batch_size
-        x_single, y_single = x_train[start:end], y_train[start:end]
+    total = 0.0
+    # A new permutation each epoch; batches are gathered into one buffer
+    for i, (x_batch, y_batch) in enumerate(train_batches):
         # wrap them in Variable
-        inputs, labels = Variable(from_numpy(x_single)).float(), Variable(from_numpy(y_single)).long()
+        inputs, labels = Variable(x_batch), Variable(y_batch)
 
         # zero the parameter gradients
         optimizer.zero_grad()
 
         # forward + backward + optimize
         outputs = net(inputs)
-        outputs = torch_mean(outputs, 1)
 
-        loss = criterion(outputs, torch_max(labels, 1)[1])
-        pred = torch_max(outputs, 1)[1]
-        pred_np = np.array(pred.data)
-        correct += np.sum(pred_np == [np.argmax(y_single)])
+        loss = criterion(outputs, labels)
+        pred = torch_max(outputs.data, 1)[1]
+        correct += (pred == y_batch).sum()
+        total += len(y_batch)
         loss.backward()
         optimizer.step()
 
@@ -166,49 +128,18 @@ for epoch in range(no_of_epochs):  # loop over the dataset multiple times
 
     logger_t.scalar_summary(tag='train_acc', value=train_acc, step=epoch)
     # get validation acc at end of each epoch
-    total, correct = 0.0, 0.0
-    for i in range(no_of_valid):
-
-        x_single, y_single = x_val[i], y_val[i]
-        x_single = x_single[np.newaxis,:,:]
-        y_single = y_single[np.newaxis, :]
-        # wrap them in Variable
-        inputs, labels = Variable(from_numpy(x_single)).float(), Variable(from_numpy(y_single)).long()
-        outputs = net(inputs)
-        outputs = torch_mean(outputs, 1)
-
-        _, predicted = torch_max(outputs.data, 1)
-        total += labels.size(0)
-        predicted = predicted.numpy()
-        true = np.argmax(y_single, axis=1)
-        correct += (predicted == true).sum()
-        #correct += (predicted == torch_max(labels, 1)[1]).sum()
-    val_acc = correct/total
+    predicted = predict(net, x_val, batch_size=eval_batch_size)
+    val_acc = np.mean(predicted == np.argmax(y_val, axis=1))
 
     logger_t.scalar_summary(tag= 'val_acc', value= val_acc, step= epoch)
     logger_t.scalar_summary(tag= 'train_loss', value= running_loss/i, step= epoch)
 
     print('[%d] val_acc: %.3f' %
-          (epoch + 1, correct / total))
-
-to_write = []
-for i in range(len(test_data)):
-    x_single = x_test[i]
-    x_single = x_single[np.newaxis,:,:]
-    inputs = Variable(from_numpy(x_single)).float()
-    outputs = net(inputs)
-    outputs = torch_mean(outputs, 1)
-    _, predicted = torch_max(outputs.data, 1)
-    predicted = np.array(predicted)
-    for p in predicted:
-        to_write.append(p)
-
-file_name = 'part1.1.txt'
-file = open(file_name, 'w')
-
-for i in to_write:
-    file.write("%s\n" % i)
-file.close()
+          (epoch + 1, val_acc))
+
+save_net(net, 'part1.1_net.pth')
+write_predictions('part1.1.txt',
+                  predict_proba(net, x_test, batch_size=eval_batch_size))
 # print(history.history.keys())
 # # summarize history for accuracy
 # plt.plot(history.history['acc'])